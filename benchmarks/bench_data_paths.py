@@ -0,0 +1,213 @@
+"""数据路径基准测试
+
+对每种数据规模，用 synthetic.py 生成合成数据库后，测量界面各操作背后的数据层调用：
+  - load_data         : 查询页首屏（_load_data：自定义学科 + 人数 + 按总成绩排序的第一页）
+  - load_data_search  : 带姓名前缀和分数范围筛选的查询页首屏
+  - load_data_ranks   : 显示排名列的查询页首屏
+  - show_statistics   : 一场考试各学科的完整统计量（汇总 + 百分位数，与命令行 stats 相同）
+  - statistics_summary: 统计页首先显示的汇总统计和柱状图数据（_show_statistics，读取 subject_stats）
+  - export_data       : 导出全部学生到 Excel（_export_data）
+  - submit_student    : 录入页提交一名学生（_submit_student，每次一个事务）
+  - delete_exam       : 删除一场考试（_delete_exam，级联删除学生和自定义学科成绩）
+
+结果（含提交号、Python/SQLite 版本和参数）写入 JSON 文件；--compare 与之前的结果对比中位数。
+
+用法: python benchmarks/bench_data_paths.py [--rows N ...] [--repeat N] [--output FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import student_db  # noqa: E402
+import synthetic  # noqa: E402
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ROWS = [1000, 10000, 100000, 1000000]
+
+SORT_OPTION = "总成绩从高到低"
+
+# 查询页搜索：姓名前缀 + 总成绩范围
+SEARCH_FILTERS = ("王", (("total_score", 200.0, None),))
+
+# 导出耗时与数据量成正比，只测量一次
+SINGLE_RUN = {"export_data"}
+
+
+def percentile(timings, p):
+    """返回耗时列表的 p 百分位数（最近秩）"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def summarize(timings):
+    """把耗时列表（秒）汇总为毫秒统计量"""
+    return {
+        "runs": len(timings),
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "min_ms": min(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+    }
+
+
+def timed(func, repeat, setup=None):
+    """执行 repeat 次 func 并返回每次的耗时；setup 在每次执行前调用，不计入耗时"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def git_revision():
+    """返回当前提交号及工作区是否有未提交的修改，不在 git 仓库中时返回 (None, None)"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def bench_size(rows, args, tmp):
+    """生成 rows 条记录的合成数据库并测量各操作，返回生成耗时、文件大小和 {操作: 统计量}"""
+    db_path = os.path.join(tmp, f"bench_{rows}.db")
+    start = time.perf_counter()
+    conn = synthetic.build(db_path, rows, args.exams, args.subjects, args.seed, args.profile)
+    seed_seconds = time.perf_counter() - start
+    exam = synthetic.exam_name(0)
+    scratch_exam = "基准待删除考试"
+    results = {}
+
+    def load_first_page(filters=None, with_ranks=False):
+        student_db.fetch_exam_custom_fields(conn, exam)
+        student_db.count_exam_students(conn, exam, filters)
+        student_db.fetch_student_page(conn, exam, SORT_OPTION, 0, student_db.QUERY_PAGE_SIZE, filters, with_ranks)
+
+    def copy_exam():
+        # 复制第一场考试作为待删除的考试，删除后回收空闲页（界面在后台执行），保持数据库大小不变
+        conn.execute("BEGIN")
+        scratch_id = student_db.ensure_exam(conn, scratch_exam)
+        exam_id = student_db.fetch_exam_id(conn, exam)
+        offset = conn.execute("SELECT MAX(id) FROM students").fetchone()[0]
+        conn.execute("""
+            INSERT INTO students (id, name, chinese, math, english, exam_id)
+            SELECT id + ?, name, chinese, math, english, ? FROM students WHERE exam_id = ?
+        """, (offset, scratch_id, exam_id))
+        conn.execute("""
+            INSERT INTO student_fields (student_id, subject_id, field_value)
+            SELECT student_id + ?, subject_id, field_value FROM student_fields
+            WHERE student_id IN (SELECT id FROM students WHERE exam_id = ?)
+        """, (offset, exam_id))
+        conn.commit()
+
+    custom_scores = {name: "80" for name in synthetic.SUBJECT_NAMES[:args.subjects]}
+    submitted = iter(range(sys.maxsize))
+    operations = {
+        "load_data": (load_first_page, None),
+        "load_data_search": (lambda: load_first_page(SEARCH_FILTERS), None),
+        "load_data_ranks": (lambda: load_first_page(with_ranks=True), None),
+        "show_statistics": (lambda: student_db.compute_exam_statistics(conn, exam), None),
+        "statistics_summary": (lambda: student_db.fetch_subject_stats(conn, exam), None),
+        "export_data": (lambda: student_db.export_students(conn, os.path.join(tmp, "export.xlsx")), None),
+        "submit_student": (lambda: student_db.add_student(conn, f"基准学生{next(submitted)}", 90.0, 85.5, None,
+                                                          exam, custom_scores), None),
+        "delete_exam": (lambda: (student_db.delete_exam(conn, scratch_exam), student_db.compact_db(conn)),
+                        copy_exam),
+    }
+    for name, (func, setup) in operations.items():
+        if args.only and name not in args.only:
+            continue
+        # 预热一次，使页缓存状态与界面中反复操作时一致
+        if setup is None and name not in SINGLE_RUN:
+            func()
+        repeat = 1 if name in SINGLE_RUN else args.repeat
+        results[name] = summarize(timed(func, repeat, setup))
+        print(f"{rows:>10}  {name:<18}{results[name]['median_ms']:>12.2f}{results[name]['p95_ms']:>12.2f}",
+              flush=True)
+
+    conn.close()
+    return {"rows": rows, "seed_seconds": seed_seconds, "db_bytes": os.path.getsize(db_path),
+            "operations": results}
+
+
+def compare(baseline, current):
+    """按 (数据规模, 操作) 对比两次结果的中位数"""
+    before = {(size["rows"], name): stats["median_ms"]
+              for size in baseline["results"] for name, stats in size["operations"].items()}
+    print(f"\n对比 {baseline['meta']['commit'] or '?'} → {current['meta']['commit'] or '?'}")
+    print(f"{'记录数':>10}  {'操作':<18}{'之前(ms)':>12}{'现在(ms)':>12}{'比值':>8}")
+    matched = 0
+    for size in current["results"]:
+        for name, stats in size["operations"].items():
+            old = before.get((size["rows"], name))
+            if old is None:
+                continue
+            matched += 1
+            print(f"{size['rows']:>10}  {name:<18}{old:>12.2f}{stats['median_ms']:>12.2f}"
+                  f"{stats['median_ms'] / old:>8.2f}")
+    if not matched:
+        print("两次结果没有相同的数据规模和操作，无法对比")
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="数据规模（学生成绩记录总数）")
+    parser.add_argument("--exams", type=int, default=10, help="考试场数")
+    parser.add_argument("--subjects", type=int, default=3, help="每名学生的自定义学科数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--profile", choices=student_db.DB_PROFILES, default=student_db.DB_PROFILE,
+                        help="数据库连接配置")
+    parser.add_argument("--repeat", type=int, default=20, help="每项操作的测量次数（导出只测一次）")
+    parser.add_argument("--only", nargs="+", help="只测量这些操作")
+    parser.add_argument("--output", default="bench_data_paths.json", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前的结果 JSON 文件对比")
+    args = parser.parse_args()
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "params": {key: getattr(args, key)
+                       for key in ("rows", "exams", "subjects", "seed", "profile", "repeat")},
+        },
+        "results": [],
+    }
+
+    print(f"{'记录数':>10}  {'操作':<18}{'中位数(ms)':>12}{'P95(ms)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            report["results"].append(bench_size(rows, args, tmp))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,80 @@
+"""SQLite 连接配置基准测试
+
+对 student_db.DB_PROFILES 中的每种配置，在临时数据库中预置一场考试的学生后测量：
+  - 提交延迟: student_db.add_student（录入页“提交”的写入路径，每次一个事务并提交）
+  - 读取延迟: 查询页首屏（自定义学科列表 + 人数 + 按总成绩排序的第一页）
+
+用法: python benchmarks/bench_sqlite_profile.py [--students N] [--commits N] [--reads N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import student_db  # noqa: E402
+
+EXAM_NAME = "基准考试"
+
+
+def percentile(timings, p):
+    """返回耗时列表的 p 百分位数（最近秩）"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def seed(conn, students):
+    """预置一场考试的学生，每名学生带一门自定义学科"""
+    exam_id = student_db.ensure_exam(conn, EXAM_NAME)
+    subject_id = student_db.ensure_subjects(conn, ["物理"])["物理"]
+    conn.executemany("INSERT INTO students (id, name, chinese, math, english, exam_id) VALUES (?, ?, ?, ?, ?, ?)",
+                     [(i, f"学生{i}", i % 100, (i * 7) % 100, (i * 13) % 100, exam_id)
+                      for i in range(1, students + 1)])
+    conn.executemany("INSERT INTO student_fields (student_id, subject_id, field_value) VALUES (?, ?, ?)",
+                     [(i, subject_id, str(i % 100)) for i in range(1, students + 1)])
+    conn.commit()
+
+
+def bench_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = student_db.connect_db(os.path.join(tmp, "bench.db"), profile)
+        student_db.init_schema(conn)
+        seed(conn, args.students)
+
+        commit_timings = []
+        for i in range(args.commits):
+            start = time.perf_counter()
+            student_db.add_student(conn, f"新学生{i}", 90.0, 80.0, None, EXAM_NAME, {"物理": "70"})
+            commit_timings.append(time.perf_counter() - start)
+
+        read_timings = []
+        for _ in range(args.reads):
+            start = time.perf_counter()
+            student_db.fetch_exam_custom_fields(conn, EXAM_NAME)
+            student_db.count_exam_students(conn, EXAM_NAME)
+            student_db.fetch_student_page(conn, EXAM_NAME, "总成绩从高到低", 0)
+            read_timings.append(time.perf_counter() - start)
+
+        conn.close()
+    return commit_timings, read_timings
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20000, help="预置的学生人数")
+    parser.add_argument("--commits", type=int, default=200, help="测量提交延迟的次数")
+    parser.add_argument("--reads", type=int, default=200, help="测量读取延迟的次数")
+    args = parser.parse_args()
+
+    print(f"{'配置':<10}{'提交中位数(ms)':>16}{'提交P95(ms)':>14}{'读取中位数(ms)':>16}{'读取P95(ms)':>14}")
+    for profile in student_db.DB_PROFILES:
+        commits, reads = bench_profile(profile, args)
+        print(f"{profile:<10}{statistics.median(commits) * 1000:>16.3f}{percentile(commits, 95) * 1000:>14.3f}"
+              f"{statistics.median(reads) * 1000:>16.3f}{percentile(reads, 95) * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,77 @@
+"""启动耗时基准测试
+
+在全新的子进程中重复测量冷启动耗时（中位数 / 最小值）：
+  - import main                        : 本程序模块的导入耗时（matplotlib/openpyxl 延迟加载）
+  - 命令行 cli.py exams                : 无图形界面的命令行工具从启动到输出考试列表
+  - 立即导入 matplotlib + openpyxl      : 改为延迟加载前启动时需要额外承担的导入耗时
+  - 显示登录页（需图形界面，--gui）     : 从进程启动到登录页绘制完成
+
+用法: python benchmarks/bench_startup.py [--runs N] [--gui]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    "import main": "import main",
+    "命令行 cli.py exams": "import cli\ncli.main(['exams'])",
+    "立即导入 matplotlib + openpyxl": (
+        "import openpyxl\n"
+        "import matplotlib.pyplot\n"
+        "from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg\n"
+        "from matplotlib.figure import Figure"
+    ),
+}
+
+GUI_SNIPPET = (
+    "import tkinter as tk\n"
+    "import main\n"
+    "root = tk.Tk()\n"
+    "app = main.StudentSystem(root)\n"
+    "root.update()\n"
+)
+
+TIMER = (
+    "import time\n"
+    "_start = time.perf_counter()\n"
+    "{code}\n"
+    "print(time.perf_counter() - _start)\n"
+)
+
+
+def measure(code, runs, cwd):
+    """在 runs 个新进程中执行 code，返回每次的耗时（秒）"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE='1')
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", TIMER.format(code=code)], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="每项测量的进程数")
+    parser.add_argument("--gui", action="store_true", help="同时测量显示登录页的耗时（需要图形界面）")
+    args = parser.parse_args()
+
+    snippets = dict(SNIPPETS)
+    if args.gui:
+        snippets["显示登录页"] = GUI_SNIPPET
+
+    # 在临时目录中运行，避免创建或修改真实的数据库文件
+    with tempfile.TemporaryDirectory() as cwd:
+        print(f"{'测量项':<32}{'中位数(ms)':>12}{'最小值(ms)':>12}")
+        for name, code in snippets.items():
+            timings = measure(code, args.runs, cwd)
+            print(f"{name:<32}{statistics.median(timings) * 1000:>12.1f}{min(timings) * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""合成数据生成器
+
+按当前数据库结构生成可复现的合成数据库：N 场考试、M 名学生（跨考试同名即同一人）、
+每名学生 K 门自定义学科。同样的参数和随机种子总是生成内容相同的数据库。
+
+批量写入时先删除触发器，写完后一次性计算总成绩、学科汇总并关联学生身份，再重建触发器并 ANALYZE，
+结果与逐条经 add_student 写入后再做过一次维护的数据库一致。
+
+用法: python benchmarks/synthetic.py OUTPUT.db [--rows N] [--exams N] [--subjects K] [--seed S]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import student_db  # noqa: E402
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈"
+GIVEN_NAMES = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红鹏辉建国志文浩宇晨欣怡佳琪子涵梓轩"
+SUBJECT_NAMES = ["物理", "化学", "生物", "历史", "地理", "政治", "信息技术", "体育", "音乐", "美术"]
+
+# 缺考（成绩为 NULL / “无”）的比例
+MISSING_RATE = 0.02
+
+# 每批写入的学生数
+BATCH_SIZE = 10000
+
+
+def exam_name(index):
+    """第 index 场考试的名称（从 0 开始）"""
+    return f"合成考试{index + 1:03d}"
+
+
+def pupil_name(index):
+    """第 index 名学生的姓名，不同 index 的姓名互不相同"""
+    surname = SURNAMES[index % len(SURNAMES)]
+    given = GIVEN_NAMES[index // len(SURNAMES) % len(GIVEN_NAMES)]
+    serial = index // (len(SURNAMES) * len(GIVEN_NAMES))
+    return f"{surname}{given}{serial}" if serial else f"{surname}{given}"
+
+
+def _score(rng):
+    """0–100 之间、保留一位小数的成绩，按 MISSING_RATE 返回缺考"""
+    if rng.random() < MISSING_RATE:
+        return None
+    return round(min(100.0, max(0.0, rng.gauss(75, 12))), 1)
+
+
+def generate(conn, rows, exams=10, subjects=3, seed=0, progress=None):
+    """向已初始化结构的空数据库写入 rows 条学生成绩记录，平均分到 exams 场考试
+
+    每场考试的学生为同一批人（rows // exams 名），每条记录带 subjects 门自定义学科。
+    progress(已写入条数, 总条数) 每写入一批调用一次。
+    """
+    if subjects > len(SUBJECT_NAMES):
+        raise ValueError(f"自定义学科最多 {len(SUBJECT_NAMES)} 门")
+    rng = random.Random(seed)
+    per_exam = max(1, rows // exams)
+
+    conn.execute("BEGIN")
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.executemany("INSERT INTO exams (id, exam_name) VALUES (?, ?)",
+                     [(i + 1, exam_name(i)) for i in range(exams)])
+    conn.executemany("INSERT INTO subjects (id, subject_name) VALUES (?, ?)",
+                     [(i + 1, SUBJECT_NAMES[i]) for i in range(subjects)])
+    conn.executemany("INSERT INTO pupils (id, name) VALUES (?, ?)",
+                     [(i + 1, pupil_name(i)) for i in range(per_exam)])
+
+    written = 0
+    while written < rows:
+        batch = range(written, min(rows, written + BATCH_SIZE))
+        conn.executemany(
+            "INSERT INTO students (id, name, chinese, math, english, exam_id, pupil_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(i + 1, pupil_name(i % per_exam), _score(rng), _score(rng), _score(rng),
+              min(i // per_exam, exams - 1) + 1, i % per_exam + 1) for i in batch])
+        conn.executemany(
+            "INSERT INTO student_fields (student_id, subject_id, field_value) VALUES (?, ?, ?)",
+            [(i + 1, subject + 1, student_db.format_score(_score(rng)))
+             for i in batch for subject in range(subjects)])
+        written = batch.stop
+        if progress:
+            progress(written, rows)
+
+    conn.execute(f"UPDATE students SET total_score = {student_db.TOTAL_SCORE_SQL}")
+    student_db._rebuild_subject_stats(conn)
+    conn.commit()
+    student_db._create_triggers(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def build(db_path, rows, exams=10, subjects=3, seed=0, profile=student_db.DB_PROFILE, progress=None):
+    """新建合成数据库文件并返回打开的连接，文件已存在时报错"""
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} 已存在")
+    conn = student_db.connect_db(db_path, profile)
+    student_db.init_schema(conn)
+    generate(conn, rows, exams, subjects, seed, progress)
+    return conn
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="要生成的数据库文件（不能已存在）")
+    parser.add_argument("--rows", type=int, default=100000, help="学生成绩记录总数")
+    parser.add_argument("--exams", type=int, default=10, help="考试场数")
+    parser.add_argument("--subjects", type=int, default=3, help="每名学生的自定义学科数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"\r已生成 {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    conn = build(args.output, args.rows, args.exams, args.subjects, args.seed, progress=progress)
+    conn.close()
+    print(f"\n生成完成，耗时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,138 @@
+"""学生信息管理系统命令行工具：不依赖 tkinter，可在无图形界面的服务器上脚本化执行
+
+  python cli.py exams                          列出所有考试及学生人数
+  python cli.py create-exam 考试名称            创建考试
+  python cli.py import 文件 --exam 考试名称     从 Excel/CSV 批量导入学生
+  python cli.py export 文件                    导出全部学生到 Excel
+  python cli.py stats 考试名称                  输出考试各学科统计数据
+  python cli.py maintain                       清理孤立数据、重建学科汇总并回收空闲页
+
+结果逐行输出到标准输出，进度输出到标准错误；失败时以非零状态退出。
+导入、导出、创建考试和维护会以 --user 指定的用户名写入操作日志。
+指定 --trace 文件时记录执行的每条 SQL 语句的次数、耗时和返回行数，结束后写入该 JSON 文件。
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+from db_trace import QueryTracer
+from student_db import (
+    AUDIT_TIME_FORMAT, DB_PATH, DB_PROFILE, DB_PROFILES, STAT_PERCENTILES, compute_exam_statistics,
+    connect_db, create_exam, export_students, fetch_exams, format_score, import_students, init_schema,
+    run_maintenance, write_operations,
+)
+
+
+def progress(text):
+    """在标准错误上原地刷新进度"""
+    print(f"\r{text}", end='', file=sys.stderr, flush=True)
+
+
+def audit(conn, args, operation):
+    """写入一条操作日志"""
+    write_operations(conn, [(args.user, operation, datetime.now().strftime(AUDIT_TIME_FORMAT))])
+
+
+def cmd_exams(conn, args):
+    for exam_name, count in fetch_exams(conn):
+        print(f"{exam_name}\t{count}", flush=True)
+
+
+def cmd_create_exam(conn, args):
+    try:
+        create_exam(conn, args.exam)
+    except sqlite3.IntegrityError:
+        raise ValueError(f"考试 {args.exam} 已存在")
+    audit(conn, args, f"创建考试 {args.exam}")
+    print(f"考试 {args.exam} 创建成功", flush=True)
+
+
+def cmd_import(conn, args):
+    imported = import_students(conn, args.file, args.exam,
+                               lambda done: progress(f"正在导入... 已读取 {done} 条"))
+    print(file=sys.stderr)
+    audit(conn, args, f"导入学生 {imported} 名到 {args.exam}（{args.file}）")
+    print(f"已向考试 {args.exam} 导入 {imported} 名学生", flush=True)
+
+
+def cmd_export(conn, args):
+    exported = export_students(conn, args.file,
+                               lambda done, total: progress(f"正在导出... {done} / {total}"))
+    print(file=sys.stderr)
+    audit(conn, args, f"导出学生 {exported} 名（{args.file}）")
+    print(f"已导出 {exported} 名学生到 {args.file}", flush=True)
+
+
+def cmd_stats(conn, args):
+    statistics = compute_exam_statistics(conn, args.exam)
+    if not statistics:
+        raise ValueError(f"考试 {args.exam} 暂无学生数据")
+    header = ['学科', '人数', '平均分', '最高分', '最低分', '标准差'] + [f'P{p}' for p in STAT_PERCENTILES]
+    print('\t'.join(header), flush=True)
+    for _, label, stats in statistics:
+        row = [label, str(stats['count']), f"{stats['mean']:.2f}",
+               str(format_score(stats['max'])), str(format_score(stats['min'])), f"{stats['std']:.2f}"]
+        row += [f"{stats[f'p{p}']:.2f}" for p in STAT_PERCENTILES]
+        print('\t'.join(row), flush=True)
+
+
+def cmd_maintain(conn, args):
+    result = run_maintenance(conn)
+    audit(conn, args, "数据库维护")
+    print(f"已清理孤立学生 {result['orphan_students']} 名、孤立成绩 {result['orphan_fields']} 条，重建学科汇总，"
+          f"回收空闲页 {result['free_pages']} 页", flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH, help=f"数据库文件（默认 {DB_PATH}）")
+    parser.add_argument("--profile", default=DB_PROFILE, choices=list(DB_PROFILES), help="数据库连接参数配置")
+    parser.add_argument("--user", default="命令行", help="写入操作日志的用户名")
+    parser.add_argument("--trace", metavar="FILE", help="记录 SQL 语句的执行统计并写入该 JSON 文件")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("exams", help="列出所有考试及学生人数").set_defaults(func=cmd_exams)
+
+    create = commands.add_parser("create-exam", help="创建考试")
+    create.add_argument("exam", help="考试名称")
+    create.set_defaults(func=cmd_create_exam)
+
+    imp = commands.add_parser("import", help="从 Excel/CSV 批量导入学生")
+    imp.add_argument("file", help=".xlsx 或 .csv 文件，表头含“姓名”，其余列为成绩")
+    imp.add_argument("--exam", required=True, help="导入到的考试（不存在时自动创建）")
+    imp.set_defaults(func=cmd_import)
+
+    exp = commands.add_parser("export", help="导出全部学生到 Excel")
+    exp.add_argument("file", help="输出的 .xlsx 文件")
+    exp.set_defaults(func=cmd_export)
+
+    stats = commands.add_parser("stats", help="输出考试各学科统计数据")
+    stats.add_argument("exam", help="考试名称")
+    stats.set_defaults(func=cmd_stats)
+
+    maintain = commands.add_parser("maintain", help="清理孤立数据、重建学科汇总、回收空闲页并更新统计信息")
+    maintain.set_defaults(func=cmd_maintain)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    tracer = QueryTracer() if args.trace else None
+    conn = connect_db(args.db, args.profile, tracer)
+    try:
+        for notice in init_schema(conn):
+            print(f"升级数据库: {notice}", file=sys.stderr)
+        args.func(conn, args)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+        if tracer:
+            tracer.dump(args.trace)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
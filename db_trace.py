@@ -0,0 +1,225 @@
+"""数据库查询跟踪（可选开启，用于排查界面卡顿）
+
+用 sqlite3.Connection.set_trace_callback 统计 SQLite 实际执行的每条语句（包括隐式的
+BEGIN/COMMIT、触发器和 executescript 中的语句），再用连接和游标子类记录经 Python 执行的
+语句的耗时（执行 + 读取结果）和返回行数。语句中的参数和字面量替换为 ? 后按语句汇总，
+并标记疑似 N+1 的查询：同一条 SELECT 在短时间内被逐条执行很多次，通常是在循环中逐个学生查询。
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# 设置该环境变量（任意非空值）后启动图形界面即开启查询跟踪，在隐藏的诊断页（Ctrl+Shift+D）查看；
+# 命令行工具使用 --trace 选项
+TRACE_ENV = 'STUDENT_DB_TRACE'
+
+# 每条语句保留最近多少次执行的耗时，用于计算 P95
+TRACE_TIMINGS = 1000
+
+# 同一条 SELECT 连续执行的间隔都小于 N_PLUS_ONE_GAP 秒、且连续执行达到 N_PLUS_ONE_THRESHOLD 次时视为 N+1
+N_PLUS_ONE_THRESHOLD = 20
+N_PLUS_ONE_GAP = 0.05
+
+# 字符串、数字、NULL 字面量和命名参数；跟踪回调得到的是代入参数后的语句，替换后才能与带参数的语句归为一类
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b|\bNULL\b|[:@$]\w+",
+                         re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """把语句中的字面量替换为 ?，并合并空白，作为统计时的语句标识"""
+    return _LITERAL_RE.sub('?', " ".join(sql.split())).rstrip(';').strip()
+
+
+class QueryTracer:
+    """按语句汇总执行次数、耗时和返回行数，可被多个连接（包括后台线程的连接）共用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.started = datetime.now()
+
+    def attach(self, conn):
+        """开始跟踪 TracedConnection 连接上执行的语句"""
+        conn.tracer = self
+        conn.set_trace_callback(self._on_statement)
+
+    def reset(self):
+        """清空已记录的统计"""
+        with self._lock:
+            self._stats.clear()
+            self.started = datetime.now()
+
+    def _entry(self, key):
+        """返回语句的统计项，不存在时创建（需持有锁）"""
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {
+                'executions': 0, 'statements': 0, 'total_time': 0.0, 'rows': 0,
+                'timings': deque(maxlen=TRACE_TIMINGS), 'last_start': None, 'burst': 0, 'max_burst': 0,
+            }
+        return stats
+
+    def _on_statement(self, sql):
+        """set_trace_callback 的回调：SQLite 每开始执行一条语句调用一次"""
+        key = normalize_sql(sql)
+        with self._lock:
+            self._entry(key)['statements'] += 1
+
+    def begin(self, sql):
+        """记录一次经 Python 执行的语句，返回本次执行的记录 [语句, 耗时, 行数]，由 finish 提交"""
+        key = normalize_sql(sql)
+        now = time.perf_counter()
+        with self._lock:
+            stats = self._entry(key)
+            stats['executions'] += 1
+            if stats['last_start'] is not None and now - stats['last_start'] < N_PLUS_ONE_GAP:
+                stats['burst'] += 1
+            else:
+                stats['burst'] = 1
+            stats['max_burst'] = max(stats['max_burst'], stats['burst'])
+            stats['last_start'] = now
+        return [key, 0.0, 0]
+
+    def finish(self, record):
+        """提交一次执行的耗时和返回行数"""
+        key, seconds, rows = record
+        with self._lock:
+            stats = self._entry(key)
+            stats['total_time'] += seconds
+            stats['rows'] += rows
+            stats['timings'].append(seconds)
+
+    def snapshot(self):
+        """按总耗时从高到低返回各语句的统计，耗时单位为毫秒"""
+        with self._lock:
+            items = [(key, dict(stats, timings=sorted(stats['timings']))) for key, stats in self._stats.items()]
+        report = []
+        for key, stats in items:
+            timings = stats['timings']
+            report.append({
+                'sql': key,
+                'executions': stats['executions'],
+                'statements': stats['statements'],
+                'rows': stats['rows'],
+                'total_ms': stats['total_time'] * 1000,
+                'mean_ms': stats['total_time'] / len(timings) * 1000 if timings else None,
+                'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000 if timings else None,
+                'max_burst': stats['max_burst'],
+                'n_plus_one': (stats['max_burst'] >= N_PLUS_ONE_THRESHOLD
+                               and key.upper().startswith(('SELECT', 'WITH'))),
+            })
+        report.sort(key=lambda item: item['total_ms'], reverse=True)
+        return report
+
+    def dump(self, file_path):
+        """把当前统计写入 JSON 文件"""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'started': self.started.isoformat(timespec='seconds'),
+                'dumped': datetime.now().isoformat(timespec='seconds'),
+                'sqlite': sqlite3.sqlite_version,
+                'statements': self.snapshot(),
+            }, f, ensure_ascii=False, indent=2)
+
+
+class TracedCursor(sqlite3.Cursor):
+    """记录每次执行的耗时和返回行数的游标；结果读完、游标关闭或再次执行时提交本次记录"""
+
+    _record = None
+
+    def _finish(self):
+        if self._record is not None:
+            self.connection.tracer.finish(self._record)
+            self._record = None
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._record is not None:
+                self._record[1] += time.perf_counter() - start
+
+    def _run(self, method, sql, *args):
+        self._finish()
+        self._record = self.connection.tracer.begin(sql)
+        try:
+            self._timed(method, sql, *args)
+        except BaseException:
+            self._finish()
+            raise
+        # 非查询语句没有结果可读，立即提交
+        if self.description is None:
+            self._finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._run(super().executescript, sql_script)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._record is not None:
+            self._record[2] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        elif self._record is not None:
+            self._record[2] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._record is not None:
+            self._record[2] += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._record is not None:
+            self._record[2] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TracedConnection(sqlite3.Connection):
+    """游标默认为 TracedCursor 的连接；Connection.execute 等快捷方法不经过 cursor()，需单独转发"""
+
+    tracer = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
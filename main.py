@@ -1,15 +1,26 @@
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
 import sqlite3
-import openpyxl
 import hashlib
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-
-# 确保中文显示正常
-plt.rcParams["font.family"] = ["SimHei", "WenQuanYi Micro Hei", "Heiti TC"]
-plt.rcParams["axes.unicode_minus"] = False  # 正确显示负号
+import itertools
+import os
+import queue
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from db_trace import TRACE_ENV, QueryTracer
+from student_db import (
+    DB_PATH, MISSING_SCORE, SORT_OPTIONS, QUERY_PAGE_SIZE, SCORE_COLUMNS, RANK_KINDS,
+    STAT_PERCENTILES, AUDIT_TIME_FORMAT, AUDIT_PAGE_SIZE, NEW_PUPIL, StudentInfo, parse_score, format_score,
+    connect_db, init_schema, compact_db, run_maintenance, fetch_total_includes_custom, set_total_includes_custom,
+    fetch_exam_names, create_exam, delete_exam, fetch_exam_custom_fields, count_exam_students, fetch_student_page,
+    fetch_student, fetch_student_info, fetch_student_pupil, fetch_pupils, fetch_custom_scores, add_student,
+    update_student, delete_student, fetch_subject_stats, compute_exam_percentiles, compute_student_trend,
+    export_students, import_students, write_operations, parse_audit_time, fetch_operations,
+    fetch_users, fetch_username, authenticate, check_password, create_user, update_user, delete_user,
+)
 
 # 颜色和字体常量 - 采用更现代的配色方案
 BG_COLOR = 'white'
@@ -20,9 +31,445 @@ BTN_FG_COLOR = 'black'
 FONT = ('Microsoft YaHei', 10)
 HEADER_FONT = ('Microsoft YaHei', 12, 'bold')
 
+# 定期执行 PRAGMA optimize 的间隔（毫秒）
+DB_OPTIMIZE_INTERVAL = 60 * 60 * 1000
+
+# 后台数据库线程结果的轮询间隔（毫秒）
+DB_POLL_INTERVAL = 50
+
+# 关闭程序时最多等待后台数据库线程执行完已提交任务的时间（秒）
+DB_WORKER_JOIN_TIMEOUT = 30
+
+# 查询结果缓存的内存上限（字节，按对象大小估算）
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# 登录页显示后多久开始在后台预加载 matplotlib/openpyxl（毫秒）
+PRELOAD_DELAY = 500
+
 # 加密密钥的哈希值（原密钥qmzyyds的哈希）
 SECRET_KEY_HASH = hashlib.sha256(b'qmzyyds').hexdigest()
 
+# 搜索框停止输入多久后才执行查询（毫秒）
+SEARCH_DEBOUNCE = 150
+
+# 操作日志在内存中缓冲，每隔多久（毫秒）或积累多少条后交给后台线程批量写入
+AUDIT_FLUSH_INTERVAL = 2000
+AUDIT_FLUSH_SIZE = 100
+
+# 统计页保留最近多少张已渲染的图表画面（800x500 像素约 1.6MB 一张），切换回来时直接贴回
+CHART_RENDER_CACHE = 8
+
+# 柱状图各学科的颜色
+BAR_COLORS = ['#3498db', '#2ecc71', '#e74c3c', '#f39c12', '#9b59b6']
+
+
+def load_matplotlib():
+    """首次绘图时才导入 matplotlib（启动时不加载），返回 (Figure, FigureCanvasTkAgg)"""
+    import matplotlib
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+
+    # 确保中文显示正常
+    matplotlib.rcParams["font.family"] = ["SimHei", "WenQuanYi Micro Hei", "Heiti TC"]
+    matplotlib.rcParams["axes.unicode_minus"] = False  # 正确显示负号
+    return Figure, FigureCanvasTkAgg
+
+
+def preload_heavy_modules():
+    """在后台线程中预先导入 matplotlib 和 openpyxl，使首次统计/导出/导入无需等待"""
+    import openpyxl  # noqa: F401
+    load_matplotlib()
+
+
+def _estimate_size(value):
+    """估算缓存对象占用的内存（字节）"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+class ExamCache:
+    """按考试缓存查询结果（自定义学科列表、排序后的分页、统计数据），LRU 淘汰并限制总内存
+
+    键的形式为 (类别, 考试名称, ...)。本程序的写操作通过 invalidate 精确失效对应考试，
+    其他连接（后台线程、其他进程）的写入通过 PRAGMA data_version 检测后清空全部缓存；
+    后台线程写入操作日志不影响缓存内容，写入前后分别调用 expect_own_write 和 accept_own_write，不清空。
+    只在 Tk 主线程中使用。
+    """
+
+    def __init__(self, conn, max_bytes=CACHE_MAX_BYTES):
+        self.conn = conn
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        # 每次失效递增；后台任务开始前记录，完成时若已变化则丢弃结果，避免写回过期数据
+        self.generation = 0
+        self.data_version = self._read_data_version()
+
+    def _read_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self):
+        data_version = self._read_data_version()
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.clear()
+
+    def expect_own_write(self):
+        """本程序后台线程提交不影响缓存内容的写入之前调用：先处理此前其他连接的写入，返回当前的 data_version"""
+        self._check_data_version()
+        return self.data_version
+
+    def accept_own_write(self, data_version):
+        """上述写入提交后调用，data_version 为 expect_own_write 的返回值
+
+        主连接把两次读取之间其他连接的提交合并为一次变化。读到的值只比写入前多 1 时视为只有这次写入，保留缓存；
+        否则期间还有其他提交，清空缓存。仍无法区分的情况：其他进程在提交任务之后、回调之前提交，
+        且这期间主连接没有读取过 data_version，它的提交与这次写入合并成了一次变化。
+        """
+        current = self._read_data_version()
+        if current != data_version + 1:
+            self.clear()
+        self.data_version = current
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        self._check_data_version()
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, generation=None):
+        """写入缓存；generation 与当前不一致（期间发生过写入）时不写入"""
+        if generation is not None and generation != self.generation:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self._discard(key)
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def invalidate(self, *exam_names):
+        """使指定考试的全部缓存失效"""
+        for key in [key for key in self.entries if key[1] in exam_names]:
+            self._discard(key)
+        self.generation += 1
+
+    def clear(self):
+        """清空全部缓存"""
+        self.entries.clear()
+        self.size = 0
+        self.generation += 1
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class JobCancelled(Exception):
+    """后台任务已被取消"""
+
+
+class DBJob:
+    """提交给 DBWorker 的一个任务"""
+
+    def __init__(self, worker, func, args, on_done, on_error, on_progress):
+        self.worker = worker
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = False
+
+    def cancel(self):
+        """取消任务：未开始的任务直接跳过，正在执行的 SQL 通过 interrupt 中断"""
+        self.cancelled = True
+        self.worker.interrupt(self)
+
+    def report(self, *progress):
+        """在后台线程中汇报进度，任务已取消时抛出 JobCancelled 以终止执行"""
+        if self.cancelled:
+            raise JobCancelled()
+        self.worker.results.put((self, 'progress', progress))
+
+
+class DBWorker:
+    """后台数据库线程：独占一个连接，按提交顺序执行任务，结果通过 root.after 轮询交回 Tk 主线程"""
+
+    def __init__(self, root, db_path, tracer=None):
+        self.root = root
+        self.db_path = db_path
+        self.tracer = tracer
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.conn = None
+        self.current_job = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="DBWorker", daemon=True)
+        self._thread.start()
+        self._poll()
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None):
+        """提交任务，后台线程以 func(conn, *args) 执行；提供 on_progress 时额外传入 progress=job.report"""
+        job = DBJob(self, func, args, on_done, on_error, on_progress)
+        self.jobs.put(job)
+        return job
+
+    def interrupt(self, job):
+        """中断正在执行的指定任务"""
+        with self._lock:
+            if self.current_job is job and self.conn is not None:
+                self.conn.interrupt()
+
+    def stop(self):
+        """处理完已提交的任务后结束后台线程"""
+        self.jobs.put(None)
+
+    def _run(self):
+        self.conn = connect_db(self.db_path, tracer=self.tracer)
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if job.cancelled:
+                continue
+
+            with self._lock:
+                self.current_job = job
+            try:
+                if job.on_progress:
+                    result = job.func(self.conn, *job.args, progress=job.report)
+                else:
+                    result = job.func(self.conn, *job.args)
+                self.results.put((job, 'done', result))
+            except Exception as e:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                self.results.put((job, 'error', e))
+            finally:
+                with self._lock:
+                    self.current_job = None
+        self.conn.close()
+
+    def join(self, timeout=None):
+        """等待后台线程结束（须先调用 stop），返回线程是否已结束"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _poll(self):
+        """在 Tk 主线程中分发后台任务的结果
+
+        回调抛出的异常只影响该任务，弹窗提示后继续分发，轮询无论如何都会继续安排。
+        """
+        try:
+            while True:
+                try:
+                    job, kind, payload = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if not job.cancelled:
+                    self._dispatch(job, kind, payload)
+        finally:
+            self.root.after(DB_POLL_INTERVAL, self._poll)
+
+    def _dispatch(self, job, kind, payload):
+        """调用任务的进度、完成或出错回调"""
+        try:
+            if kind == 'progress':
+                job.on_progress(*payload)
+            elif kind == 'done':
+                if job.on_done:
+                    job.on_done(payload)
+            elif job.on_error:
+                job.on_error(payload)
+            else:
+                messagebox.showerror("错误", f"操作失败: {str(payload)}，请稍后再试。")
+        except Exception as e:
+            messagebox.showerror("错误", f"处理后台任务结果时出错: {str(e)}")
+
+
+class AuditLog:
+    """操作日志：事件先缓冲在内存中，定期或积累到 AUDIT_FLUSH_SIZE 条后由后台数据库线程批量写入
+
+    只在 Tk 主线程中使用。
+    """
+
+    def __init__(self, root, db_worker, cache):
+        self.root = root
+        self.db_worker = db_worker
+        self.cache = cache
+        self.pending = []
+        self.root.after(AUDIT_FLUSH_INTERVAL, self._scheduled_flush)
+
+    def record(self, username, operation):
+        """记录一条操作"""
+        self.pending.append((username, operation, datetime.now().strftime(AUDIT_TIME_FORMAT)))
+        if len(self.pending) >= AUDIT_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """将缓冲的事件交给后台线程写入；后台任务按提交顺序执行，之后提交的查询能读到这些事件"""
+        if not self.pending:
+            return
+        events, self.pending = self.pending, []
+        data_version = self.cache.expect_own_write()
+
+        def on_error(error):
+            # 写入失败时放回缓冲区，下次再试
+            self.pending[:0] = events
+
+        self.db_worker.submit(write_operations, events,
+                              on_done=lambda _: self.cache.accept_own_write(data_version), on_error=on_error)
+
+    def close(self, conn):
+        """程序退出时用主线程连接同步写入剩余事件"""
+        if self.pending:
+            write_operations(conn, self.pending)
+            self.pending = []
+
+    def _scheduled_flush(self):
+        self.flush()
+        self.root.after(AUDIT_FLUSH_INTERVAL, self._scheduled_flush)
+
+
+class StatisticsChart:
+    """统计页的结果区：统计文字和一个常驻的 Figure/画布，学科柱状图和成绩趋势图共用
+
+    切换考试时不新建 Figure：学科与当前柱子相同时用 set_height 原地更新柱高，否则才重建坐标轴，
+    再由 draw_idle 合并重绘。每次绘制完成后按 (图表内容, 画布大小) 缓存渲染好的画面，
+    再次显示相同内容时直接贴回，不必重新渲染。页面销毁时清空 Figure 并释放缓存的画面。
+    只在 Tk 主线程中使用。
+    """
+
+    def __init__(self, parent):
+        self.frame = tk.Frame(parent, bg=BG_COLOR)
+        self.frame.pack(fill=tk.BOTH, expand=True)
+        self.label = tk.Label(self.frame, font=FONT, bg=BG_COLOR, justify=tk.LEFT)
+        self.label.pack(pady=20, anchor=tk.W)
+        self.figure = None
+        self.canvas = None
+        self.ax = None
+        # 当前柱状图的 BarContainer 和对应的学科 id，显示趋势图时为 None
+        self.bars = None
+        self.subjects = None
+        # 当前显示的内容，如 ('stats', 考试名称)；后台结果返回时据此判断是否已切换到别的内容
+        self.showing = None
+        # 当前图表内容的标识，绘制完成时作为已渲染画面的缓存键
+        self.content = None
+        self.renders = OrderedDict()
+        self.frame.bind('<Destroy>', self._on_destroy)
+
+    def show_message(self, text):
+        """只显示一行提示（如无数据），隐藏图表"""
+        self.showing = self.content = None
+        self.label.config(text=text, font=HEADER_FONT)
+        if self.canvas is not None:
+            self.canvas.get_tk_widget().pack_forget()
+
+    def set_text(self, text):
+        """更新统计文字"""
+        self.label.config(text=text, font=FONT)
+
+    def show_statistics(self, exam_name, statistics, text):
+        """显示一场考试的统计文字和各学科平均分柱状图"""
+        self.showing = ('stats', exam_name)
+        self.set_text(text)
+        self._ensure_canvas()
+        ax = self.ax
+        subjects = [subject_id for subject_id, _, _ in statistics]
+        labels = [label for _, label, _ in statistics]
+        averages = [stats['mean'] for _, _, stats in statistics]
+        if self.bars is not None and subjects == self.subjects:
+            for bar, average in zip(self.bars, averages):
+                bar.set_height(average)
+            ax.relim()
+            ax.autoscale_view()
+        else:
+            ax.clear()
+            self.bars = ax.bar(labels, averages, color=BAR_COLORS)
+            self.subjects = subjects
+            ax.set_xlabel('学科', fontsize=12)
+            ax.set_ylabel('平均分', fontsize=12)
+            ax.tick_params(axis='x', rotation=45)  # 学科名称旋转45度避免重叠
+        ax.set_title(f'{exam_name} 各学科平均分', fontsize=14)
+        self._show(('stats', exam_name, tuple(subjects), tuple(labels), tuple(averages)))
+
+    def show_trend(self, student_name, column, trend):
+        """显示学生成绩与考试平均分随考试变化的折线图"""
+        self.showing = ('trend', student_name, column)
+        self.set_text("")
+        self._ensure_canvas()
+        ax = self.ax
+        ax.clear()
+        self.bars = self.subjects = None
+        exams = [point.exam_name for point in trend]
+        positions = range(len(exams))
+        ax.plot(positions, [point.score for point in trend], marker='o', color='#3498db', label=student_name)
+        ax.plot(positions, [point.exam_mean for point in trend], marker='s', linestyle='--', color='#95a5a6',
+                label='考试平均分')
+        ax.set_xticks(list(positions))
+        ax.set_xticklabels(exams, rotation=45)
+        ax.set_xlabel('考试', fontsize=12)
+        ax.set_ylabel(SCORE_COLUMNS[column], fontsize=12)
+        ax.set_title(f'{student_name} {SCORE_COLUMNS[column]}成绩趋势', fontsize=14)
+        ax.legend()
+        self._show(('trend', student_name, column, tuple(trend)))
+
+    def _ensure_canvas(self):
+        """首次绘图时创建 Figure 和画布，之后一直复用；画布被 show_message 隐藏时重新显示"""
+        if self.canvas is None:
+            Figure, FigureCanvasTkAgg = load_matplotlib()
+            # 每次重绘时自动调整布局，学科名称或考试名称变化后也不会被裁切
+            self.figure = Figure(figsize=(8, 5), dpi=100, layout='tight')
+            self.ax = self.figure.add_subplot(111)
+            self.canvas = FigureCanvasTkAgg(self.figure, master=self.frame)
+            self.canvas.mpl_connect('draw_event', self._on_draw)
+        widget = self.canvas.get_tk_widget()
+        if not widget.winfo_manager():
+            widget.pack(pady=20, fill=tk.BOTH, expand=True)
+
+    def _show(self, content):
+        """显示 content 对应的图表：有相同大小的已渲染画面时直接贴回，否则安排一次重绘"""
+        self.content = content
+        key = (content, self.canvas.get_width_height())
+        region = self.renders.get(key)
+        if region is None:
+            self.canvas.draw_idle()
+            return
+        self.renders.move_to_end(key)
+        self.canvas.restore_region(region)
+        self.canvas.blit()
+
+    def _on_draw(self, event):
+        """每次绘制完成后缓存渲染好的画面（包括窗口缩放引起的重绘）"""
+        if self.content is None:
+            return
+        key = (self.content, self.canvas.get_width_height())
+        self.renders[key] = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.renders.move_to_end(key)
+        while len(self.renders) > CHART_RENDER_CACHE:
+            self.renders.popitem(last=False)
+
+    def _on_destroy(self, event):
+        """页面销毁时释放 Figure 和缓存的画面"""
+        if event.widget is not self.frame:
+            return
+        self.renders.clear()
+        if self.figure is not None:
+            self.figure.clear()
+        self.figure = self.canvas = self.ax = self.bars = None
+
 
 class StudentSystem:
     def __init__(self, root):
@@ -36,10 +483,19 @@ class StudentSystem:
         self.style = ttk.Style()
         self._setup_styles()
 
-        self.conn = sqlite3.connect('students_encrypted.db')
-        self.cursor = self.conn.cursor()
+        # 设置 STUDENT_DB_TRACE 环境变量时记录所有连接执行的语句，在诊断页查看
+        self.tracer = QueryTracer() if os.environ.get(TRACE_ENV) else None
+        self.conn = connect_db(tracer=self.tracer)
         self._create_tables()
 
+        # 耗时的读取、统计和导出在后台线程中执行
+        self.db_worker = DBWorker(self.root, DB_PATH, self.tracer)
+        self.query_state = None
+        self.query_rows = {}
+        self.search_after_id = None
+        self.cache = ExamCache(self.conn)
+        self.audit = AuditLog(self.root, self.db_worker, self.cache)
+
         self.current_user = None
         self.dynamic_fields = {}
         self.dynamic_field_entries = []
@@ -49,10 +505,43 @@ class StudentSystem:
         # 新增变量用于存储当前查询表格和滚动条
         self.current_tree = None
         self.current_scrollbar = None
+        # 最近一次创建查询表格的请求，后台读取自定义学科期间切换考试时据此丢弃过期的结果
+        self.query_table_request = None
         self.canvas = None
 
         self.create_login_page()
 
+        # 登录页绘制完成后再在后台加载绘图和 Excel 库
+        self.root.after(PRELOAD_DELAY, lambda: threading.Thread(
+            target=preload_heavy_modules, name="Preload", daemon=True).start())
+
+        # 定期更新查询优化器统计信息，关闭窗口时再执行一次
+        self.root.after(DB_OPTIMIZE_INTERVAL, self._optimize_db)
+        self.root.protocol("WM_DELETE_WINDOW", self._close)
+
+    def _optimize_db(self):
+        """在后台线程中执行 PRAGMA optimize，并安排下一次执行"""
+        self.db_worker.submit(lambda conn: conn.execute("PRAGMA optimize"))
+        self.root.after(DB_OPTIMIZE_INTERVAL, self._optimize_db)
+
+    def _close(self):
+        """关闭程序：等待后台线程执行完已提交的任务，再写入剩余的操作日志、优化数据库并关闭连接"""
+        self.db_worker.stop()
+        # 等待期间先隐藏窗口；超时后放弃等待，未完成的任务随进程退出而中止
+        self.root.withdraw()
+        self.db_worker.join(DB_WORKER_JOIN_TIMEOUT)
+        try:
+            self.audit.close(self.conn)
+            self.conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        self.conn.close()
+        self.root.destroy()
+
+    def _audit(self, operation):
+        """以当前用户记录一条操作日志"""
+        self.audit.record(self.current_user, operation)
+
     def _setup_styles(self):
         """设置ttk样式"""
         self.style.configure('TButton', font=FONT, background=BTN_BG_COLOR, foreground=BTN_FG_COLOR)
@@ -71,23 +560,29 @@ class StudentSystem:
         window.geometry(f"{width}x{height}+{x}+{y}")
 
     def _create_tables(self):
-        """创建数据库表"""
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT)''')
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS students (
-            id INTEGER PRIMARY KEY, name TEXT, chinese TEXT, math TEXT, english TEXT, exam_name TEXT)''')
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS student_fields (
-            id INTEGER PRIMARY KEY, student_id INTEGER, field_name TEXT, field_value TEXT,
-            FOREIGN KEY (student_id) REFERENCES students(id))''')
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS operations (
-            id INTEGER PRIMARY KEY, username TEXT, operation_type TEXT, operation_time DATETIME)''')
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS exams (
-            id INTEGER PRIMARY KEY, exam_name TEXT UNIQUE)''')
-        self.conn.commit()
+        """创建数据库表，升级旧版本数据库时删除了数据则提示用户"""
+        notices = init_schema(self.conn)
+        if notices:
+            messagebox.showwarning("数据库升级", "升级数据库时：\n" + "\n".join(notices))
+
+    def _total_includes_custom(self):
+        """总成绩是否计入自定义学科"""
+        return fetch_total_includes_custom(self.conn)
+
+    def _set_total_includes_custom(self, include_custom, on_done, on_error):
+        """在后台切换总成绩是否计入自定义学科并重新计算所有学生的总成绩，完成后调用 on_done，失败时调用 on_error"""
+        def on_set(result):
+            self.cache.clear()
+            on_done()
+
+        def on_failed(error):
+            messagebox.showerror("错误", f"操作失败: {str(error)}，请稍后再试。")
+            on_error()
+
+        self.db_worker.submit(set_total_includes_custom, include_custom, on_done=on_set, on_error=on_failed)
 
     def _load_exam_names(self):
-        self.cursor.execute("SELECT exam_name FROM exams")
-        self.exam_names = [row[0] for row in self.cursor.fetchall()]
+        self.exam_names = fetch_exam_names(self.conn)
 
     def create_login_page(self):
         """创建登录页面"""
@@ -123,7 +618,7 @@ class StudentSystem:
                   command=lambda: self._handle_login(username_entry, password_entry),
                   bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT,
                   padx=5).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-        tk.Button(btn_frame, text="退出", command=self.root.destroy,
+        tk.Button(btn_frame, text="退出", command=self._close,
                   bg='#E74C3C', fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT,
                   padx=5).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
 
@@ -176,10 +671,7 @@ class StudentSystem:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # 加载账号数据
-        self.cursor.execute("SELECT id, username FROM users")
-        users = self.cursor.fetchall()
-
-        for user_id, username in users:
+        for user_id, username in fetch_users(self.conn):
             tree.insert("", tk.END, values=(username, "修改 | 删除"), iid=user_id)
 
         tree.bind("<Button-1>", lambda event: self._handle_account_tree_click(event, tree))
@@ -204,8 +696,7 @@ class StudentSystem:
     def _verify_original_password_and_key(self, user_id):
         """验证原密码和密钥"""
         result = False
-        self.cursor.execute("SELECT username FROM users WHERE id=?", (user_id,))
-        username = self.cursor.fetchone()[0]
+        username = fetch_username(self.conn, user_id)
 
         password_window = tk.Toplevel(self.root)
         password_window.title("验证原密码和密钥")
@@ -236,9 +727,7 @@ class StudentSystem:
                 messagebox.showerror("错误", "密钥错误，请重新输入。")
                 return
 
-            self.cursor.execute("SELECT * FROM users WHERE id=? AND password=?",
-                                (user_id, password))
-            if self.cursor.fetchone():
+            if check_password(self.conn, user_id, password):
                 result = True
                 password_window.destroy()
             else:
@@ -264,8 +753,7 @@ class StudentSystem:
         if not self._verify_original_password_and_key(user_id):
             return
 
-        self.cursor.execute("SELECT username FROM users WHERE id=?", (user_id,))
-        username = self.cursor.fetchone()[0]
+        username = fetch_username(self.conn, user_id)
 
         modify_window = tk.Toplevel(self.root)
         modify_window.title("修改账号")
@@ -304,13 +792,8 @@ class StudentSystem:
                 return
 
             try:
-                if password:
-                    self.cursor.execute("UPDATE users SET username=?, password=? WHERE id=?",
-                                        (new_username, password, user_id))
-                else:
-                    self.cursor.execute("UPDATE users SET username=? WHERE id=?",
-                                        (new_username, user_id))
-                self.conn.commit()
+                update_user(self.conn, user_id, new_username, password)
+                self._audit(f"修改账号 {username} → {new_username}")
                 messagebox.showinfo("成功", "账号信息已更新。")
                 modify_window.destroy()
                 self.create_account_management_page()
@@ -332,13 +815,12 @@ class StudentSystem:
         if not self._verify_original_password_and_key(user_id):
             return
 
-        self.cursor.execute("SELECT username FROM users WHERE id=?", (user_id,))
-        username = self.cursor.fetchone()[0]
+        username = fetch_username(self.conn, user_id)
 
         if messagebox.askyesno("确认", f"确定要删除账号 {username} 吗？此操作不可恢复。"):
             try:
-                self.cursor.execute("DELETE FROM users WHERE id=?", (user_id,))
-                self.conn.commit()
+                delete_user(self.conn, user_id)
+                self._audit(f"删除账号 {username}")
                 messagebox.showinfo("成功", "账号已删除。")
                 self.create_account_management_page()
             except Exception as e:
@@ -399,12 +881,13 @@ class StudentSystem:
             messagebox.showerror("错误", "用户名和密码不能为空，请输入有效的信息。")
             return
 
-        self.cursor.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password))
-        if self.cursor.fetchone():
+        if authenticate(self.conn, username, password):
             self.current_user = username
+            self._audit("登录")
             self._create_welcome_page()
             self.root.attributes('-fullscreen', True)  # 全屏显示
         else:
+            self.audit.record(username, "登录失败")
             messagebox.showerror("错误", "用户名或密码错误，请重新输入。")
 
     def _handle_register(self, username_entry, password_entry, confirm_entry, key_entry):
@@ -429,8 +912,8 @@ class StudentSystem:
             return
 
         try:
-            self.cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-            self.conn.commit()
+            create_user(self.conn, username, password)
+            self.audit.record(username, "注册账号")
             messagebox.showinfo("成功", "注册成功，请登录。")
             self.create_login_page()
         except sqlite3.IntegrityError:
@@ -474,7 +957,8 @@ class StudentSystem:
             ("查询信息", self._show_query_page),
             ("考试管理", self._show_exam_management_page),
             ("数据统计", self._show_statistics_page),
-            ("导出数据", self._export_data)
+            ("导出数据", self._export_data),
+            ("操作日志", self._show_audit_page)
         ]
 
         for text, command in nav_buttons:
@@ -489,6 +973,9 @@ class StudentSystem:
         self.content_frame = tk.Frame(self.root, bg=BG_COLOR)
         self.content_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
+        # 查询诊断页不在导航中显示，按 Ctrl+Shift+D 打开
+        self.root.bind('<Control-D>', lambda event: self._show_diagnostics_page())
+
         welcome_label = tk.Label(self.content_frame, text="欢迎使用学生信息管理系统！",
                                  font=('Microsoft YaHei', 24, 'bold'), bg=BG_COLOR)
         welcome_label.pack(pady=100)
@@ -509,7 +996,9 @@ class StudentSystem:
 
     def _logout(self):
         """处理退出登录"""
+        self._audit("退出登录")
         self.current_user = None
+        self.root.unbind('<Control-D>')
         self.root.attributes('-fullscreen', False)  # 退出全屏
         self.root.resizable(False, False)
         self.create_login_page()
@@ -534,6 +1023,10 @@ class StudentSystem:
                                  bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT)
         add_exam_btn.pack(pady=10)
 
+        import_btn = tk.Button(frame, text="批量导入（Excel/CSV）", command=lambda: self._import_data(exam_name_var.get()),
+                               bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT)
+        import_btn.pack(pady=5)
+
         # 基本信息部分 - 使用卡片效果
         basic_frame = tk.LabelFrame(frame, text="基本信息", font=HEADER_FONT, bg=BG_COLOR, bd=2, relief=tk.SOLID)
         basic_frame.pack(fill=tk.X, padx=10, pady=15)
@@ -631,14 +1124,60 @@ class StudentSystem:
             messagebox.showerror("错误", "考试名称不能为空，请输入有效的考试名称。")
             return
         try:
-            self.cursor.execute("INSERT INTO exams (exam_name) VALUES (?)", (exam_name,))
-            self.conn.commit()
+            create_exam(self.conn, exam_name)
             self._load_exam_names()
+            self._audit(f"创建考试 {exam_name}")
             messagebox.showinfo("成功", f"考试 {exam_name} 创建成功。")
             exam_name_var.set(exam_name)
         except sqlite3.IntegrityError:
             messagebox.showerror("错误", f"考试 {exam_name} 已存在，请选择其他考试名称。")
 
+    def _import_data(self, exam_name):
+        """从 Excel/CSV 批量导入学生到所选考试"""
+        exam_name = exam_name.strip()
+        if not exam_name:
+            messagebox.showerror("错误", "考试名称不能为空，请输入有效的考试名称。")
+            return
+
+        file_path = filedialog.askopenfilename(filetypes=[("Excel/CSV files", "*.xlsx *.csv"),
+                                                          ("Excel files", "*.xlsx"), ("CSV files", "*.csv")])
+        if not file_path:
+            return
+
+        # 进度窗口
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("批量导入")
+        self.center_window(progress_window, 400, 120)
+        progress_window.resizable(False, False)
+        progress_window.grab_set()
+        progress_window.configure(bg=BG_COLOR)
+
+        progress_label = tk.Label(progress_window, text="正在导入...", font=FONT, bg=BG_COLOR)
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(progress_window, length=340, mode='indeterminate')
+        progress_bar.pack(pady=10)
+        progress_bar.start()
+        # 导入在一个事务中完成，中途关闭窗口不会中断导入
+        progress_window.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        def on_progress(imported):
+            progress_label.config(text=f"正在导入... 已读取 {imported} 条")
+
+        def on_done(imported):
+            progress_window.destroy()
+            self.cache.invalidate(exam_name)
+            self._load_exam_names()
+            self._audit(f"导入学生 {imported} 名到 {exam_name}（{file_path}）")
+            messagebox.showinfo("成功", f"已向考试 {exam_name} 导入 {imported} 名学生。")
+            self._show_query_page()
+
+        def on_error(error):
+            progress_window.destroy()
+            messagebox.showerror("错误", f"导入失败: {str(error)}，请检查文件后再试。")
+
+        self.db_worker.submit(import_students, file_path, exam_name,
+                              on_done=on_done, on_error=on_error, on_progress=on_progress)
+
     def add_dynamic_field(self):
         """添加动态字段"""
         field_name = self.new_field_name.get().strip()
@@ -714,46 +1253,24 @@ class StudentSystem:
             messagebox.showerror("错误", "姓名不能为空，请输入学生姓名。")
             return
 
-        # 将空白项设置为“无”
-        if not chinese:
-            chinese = "无"
-        if not math:
-            math = "无"
-        if not english:
-            english = "无"
-
+        # 空白项按缺考处理（存储为 NULL，显示为“无”）
         try:
-            if chinese != "无":
-                chinese = float(chinese)
-            if math != "无":
-                math = float(math)
-            if english != "无":
-                english = float(english)
+            chinese = parse_score(chinese)
+            math = parse_score(math)
+            english = parse_score(english)
         except ValueError:
             messagebox.showerror("错误", "成绩必须为数字，请输入有效的成绩。")
             return
 
         try:
-            self.conn.execute("BEGIN")
-
-            # 添加新学生
-            self.cursor.execute("INSERT INTO students (name, chinese, math, english, exam_name) VALUES (?, ?, ?, ?, ?)",
-                                (name, chinese, math, english, exam_name))
-            student_id = self.cursor.lastrowid
-
-            # 添加自定义字段
-            for field_name, field_value in self.dynamic_fields.items():
-                if field_name.strip():
-                    self.cursor.execute(
-                        "INSERT INTO student_fields (student_id, field_name, field_value) VALUES (?, ?, ?)",
-                        (student_id, field_name.strip(), field_value.strip()))
-
-            self.conn.commit()
+            add_student(self.conn, name, chinese, math, english, exam_name, self.dynamic_fields)
+            self.cache.invalidate(exam_name)
+            self._load_exam_names()
+            self._audit(f"添加学生 {name}（{exam_name}）")
             messagebox.showinfo("成功", f"学生 {name} 的信息已添加。")
             self._show_query_page()
 
         except sqlite3.Error as e:
-            self.conn.execute("ROLLBACK")
             messagebox.showerror("错误", f"操作失败: {str(e)}，请稍后再试。")
 
     def _show_query_page(self):
@@ -781,8 +1298,7 @@ class StudentSystem:
         exam_name_combobox.set(self.exam_names[0] if self.exam_names else "")
 
         # 排序选择
-        sort_options = ["总成绩从高到低", "总成绩从低到高", "语文成绩从高到低", "语文成绩从低到高", "数学成绩从高到低",
-                        "数学成绩从低到高", "英语成绩从高到低", "英语成绩从低到高"]
+        sort_options = list(SORT_OPTIONS)
 
         # 存储排序变量，供后续使用
         self.sort_var = tk.StringVar()
@@ -793,13 +1309,82 @@ class StudentSystem:
         sort_combobox = ttk.Combobox(filter_frame, textvariable=self.sort_var, values=sort_options, width=30)
         sort_combobox.pack(pady=5)
 
+        # 搜索：姓名前缀和各科分数范围，输入停止 SEARCH_DEBOUNCE 毫秒后自动查询
+        tk.Label(filter_frame, text="搜索:", font=HEADER_FONT, bg=BG_COLOR).pack(anchor=tk.W, pady=5)
+        search_frame = tk.Frame(filter_frame, bg=BG_COLOR)
+        search_frame.pack(anchor=tk.W, pady=5)
+        tk.Label(search_frame, text="姓名:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+        name_var = tk.StringVar()
+        tk.Entry(search_frame, textvariable=name_var, font=FONT, bd=1, relief=tk.SOLID, width=12).pack(
+            side=tk.LEFT, padx=(0, 10))
+        range_vars = {}
+        for column, label in SCORE_COLUMNS.items():
+            low_var, high_var = tk.StringVar(), tk.StringVar()
+            tk.Label(search_frame, text=f"{label}:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+            tk.Entry(search_frame, textvariable=low_var, font=FONT, bd=1, relief=tk.SOLID, width=5).pack(side=tk.LEFT)
+            tk.Label(search_frame, text="-", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+            tk.Entry(search_frame, textvariable=high_var, font=FONT, bd=1, relief=tk.SOLID, width=5).pack(
+                side=tk.LEFT, padx=(0, 10))
+            range_vars[column] = (low_var, high_var)
+
+        # 是否显示各科排名、密集排名和百分位
+        with_ranks_var = tk.BooleanVar(value=False)
+
+        def reload():
+            self._load_data(exam_name_var.get(), self.sort_var.get(), self._read_query_filters(name_var, range_vars),
+                            with_ranks_var.get())
+
+        def schedule_search(*args):
+            if self.search_after_id:
+                self.root.after_cancel(self.search_after_id)
+            self.search_after_id = self.root.after(SEARCH_DEBOUNCE, run_search)
+
+        def run_search():
+            self.search_after_id = None
+            if self.tree.winfo_exists():
+                reload()
+
+        name_var.trace_add('write', schedule_search)
+        for low_var, high_var in range_vars.values():
+            low_var.trace_add('write', schedule_search)
+            high_var.trace_add('write', schedule_search)
+
+        # 总成绩是否计入自定义学科
+        include_custom_var = tk.BooleanVar(value=self._total_includes_custom())
+
+        def on_include_custom_change():
+            # 重新计算期间禁用选项，避免重复切换
+            include_custom_btn.config(state=tk.DISABLED)
+            include_custom = include_custom_var.get()
+
+            def on_done():
+                if include_custom_btn.winfo_exists():
+                    include_custom_btn.config(state=tk.NORMAL)
+                    reload()
+
+            def on_error():
+                if include_custom_btn.winfo_exists():
+                    include_custom_var.set(not include_custom)
+                    include_custom_btn.config(state=tk.NORMAL)
+
+            self._set_total_includes_custom(include_custom, on_done, on_error)
+
+        include_custom_btn = tk.Checkbutton(filter_frame, text="总成绩包含自定义学科", variable=include_custom_var,
+                                            command=on_include_custom_change, font=FONT, bg=BG_COLOR)
+        include_custom_btn.pack(anchor=tk.W, pady=5)
+
+        def on_with_ranks_change():
+            self._create_query_table(table_frame, exam_name_var.get(), with_ranks_var.get(), on_ready=reload)
+
+        tk.Checkbutton(filter_frame, text="显示排名和百分位", variable=with_ranks_var,
+                       command=on_with_ranks_change, font=FONT, bg=BG_COLOR).pack(anchor=tk.W, pady=5)
+
         # 右侧按钮区域
         btn_frame = tk.Frame(control_frame, bg=BG_COLOR)
         btn_frame.pack(side=tk.RIGHT, padx=20, pady=10)
 
         # 刷新按钮
-        refresh_btn = tk.Button(btn_frame, text="刷新数据",
-                                command=lambda: self._load_data(exam_name_var.get(), self.sort_var.get()),
+        refresh_btn = tk.Button(btn_frame, text="刷新数据", command=reload,
                                 bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT)
         refresh_btn.pack(pady=5, fill=tk.X)
 
@@ -812,138 +1397,363 @@ class StudentSystem:
         def on_exam_change(event):
             selected_exam = exam_name_var.get()
             # 重新创建表格并加载数据
-            self._create_query_table(frame, selected_exam)
-            self._load_data(selected_exam, self.sort_var.get())
+            self._create_query_table(table_frame, selected_exam, with_ranks_var.get(), on_ready=reload)
 
         # 绑定考试选择变化事件
         exam_name_combobox.bind("<<ComboboxSelected>>", on_exam_change)
 
         # 排序变化事件
         def on_sort_change(event):
-            selected_exam = exam_name_var.get()
-            self._load_data(selected_exam, self.sort_var.get())
+            reload()
 
         sort_combobox.bind("<<ComboboxSelected>>", on_sort_change)
 
+        # 加载进度（已加载行数 / 总行数）和取消按钮
+        status_frame = tk.Frame(frame, bg=BG_COLOR)
+        status_frame.pack(fill=tk.X)
+        self.query_status_label = tk.Label(status_frame, text="", font=FONT, bg=BG_COLOR)
+        self.query_status_label.pack(side=tk.LEFT)
+        self.query_cancel_btn = tk.Button(status_frame, text="取消", command=self._cancel_query_job,
+                                          bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT)
+
         # 表格区域
         table_frame = tk.Frame(frame, bg=BG_COLOR)
         table_frame.pack(fill=tk.BOTH, expand=True, pady=10)
 
-        # 初始创建表格
+        # 初始创建表格，建好后加载数据
         initial_exam = exam_name_var.get()
-        self._create_query_table(table_frame, initial_exam)
+        self._create_query_table(table_frame, initial_exam, on_ready=reload)
 
-        # 初始加载数据
-        self._load_data(initial_exam, self.sort_var.get())
+    def _read_query_filters(self, name_var, range_vars):
+        """读取搜索框中的筛选条件，无筛选时返回 None；无法解析的分数边界视为不限（输入尚未完成）"""
+        def bound(var):
+            try:
+                return parse_score(var.get())
+            except ValueError:
+                return None
+
+        name_prefix = name_var.get().strip()
+        ranges = tuple((column, bound(low_var), bound(high_var)) for column, (low_var, high_var) in range_vars.items())
+        ranges = tuple(item for item in ranges if item[1] is not None or item[2] is not None)
+        if not name_prefix and not ranges:
+            return None
+        return name_prefix, ranges
+
+    def _create_query_table(self, parent_frame, exam_name, with_ranks=False, on_ready=None):
+        """创建查询表格（根据考试动态生成列，with_ranks 为真时在总成绩后追加排名列）
 
-    def _create_query_table(self, parent_frame, exam_name):
-        """创建查询表格（根据考试动态生成列）"""
-        # 移除旧表格和滚动条
+        自定义学科列表未缓存时在后台读取，读取期间不显示表格；表格建好后调用 on_ready（如加载数据）。
+        """
+        # 移除旧表格和滚动条，新表格建好之前返回的查询结果随之丢弃
         if hasattr(self, 'tree') and self.tree:
             self.tree.destroy()
+        if self.current_scrollbar:
+            self.current_scrollbar.destroy()
+        request = self.query_table_request = object()
+
+        def build(custom_fields):
+            # 读取期间可能已切换到别的考试或离开了查询页
+            if request is not self.query_table_request or not parent_frame.winfo_exists():
+                return
 
-        # 查询该考试下的所有自定义学科
-        self.cursor.execute("""
-            SELECT DISTINCT field_name 
-            FROM student_fields 
-            JOIN students ON student_fields.student_id = students.id 
-            WHERE students.exam_name = ?
-        """, (exam_name,))
-        custom_fields = [row[0] for row in self.cursor.fetchall()]
+            rank_headings = {}
+            if with_ranks:
+                rank_headings = {f"{column}_{kind}": f"{label}{kind_label}"
+                                 for column, label in SCORE_COLUMNS.items()
+                                 for kind, kind_label in RANK_KINDS.items()}
+
+            columns = (['id', 'name', 'chinese', 'math', 'english'] + custom_fields + ['total_score']
+                       + list(rank_headings) + ['operation'])
+            self.tree = ttk.Treeview(parent_frame, show='headings', columns=columns)
+            self.query_rows = {}
+
+            for col in columns:
+                width = 100
+                if col == 'name':
+                    width = 150
+                elif col == 'operation':
+                    width = 120
+                self.tree.column(col, width=width, anchor=tk.CENTER)
+                if col == 'id':
+                    col_text = 'ID'
+                elif col == 'name':
+                    col_text = '姓名'
+                elif col == 'chinese':
+                    col_text = '语文'
+                elif col == 'math':
+                    col_text = '数学'
+                elif col == 'english':
+                    col_text = '英语'
+                elif col == 'total_score':
+                    col_text = '总成绩'
+                elif col == 'operation':
+                    col_text = '操作'
+                elif col in rank_headings:
+                    col_text = rank_headings[col]
+                else:
+                    col_text = col
+                self.tree.heading(col, text=col_text)
 
-        columns = ['id', 'name', 'chinese', 'math', 'english'] + custom_fields + ['operation']
-        self.tree = ttk.Treeview(parent_frame, show='headings', columns=columns)
+            # 添加滚动条，滚动接近底部时加载下一页
+            scrollbar = ttk.Scrollbar(parent_frame, orient=tk.VERTICAL, command=self.tree.yview)
+            self.tree.configure(yscroll=lambda first, last: self._on_query_tree_scroll(scrollbar, first, last))
+            self.current_scrollbar = scrollbar
 
-        for col in columns:
-            width = 100
-            if col == 'name':
-                width = 150
-            elif col == 'operation':
-                width = 120
-            self.tree.column(col, width=width, anchor=tk.CENTER)
-            if col == 'id':
-                col_text = 'ID'
-            elif col == 'name':
-                col_text = '姓名'
-            elif col == 'chinese':
-                col_text = '语文'
-            elif col == 'math':
-                col_text = '数学'
-            elif col == 'english':
-                col_text = '英语'
-            elif col == 'operation':
-                col_text = '操作'
-            else:
-                col_text = col
-            self.tree.heading(col, text=col_text)
+            self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(parent_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
+            self.tree.bind("<Button-1>", lambda event: self._handle_query_tree_click(event, self.tree))
 
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            if on_ready:
+                on_ready()
+
+        self._get_custom_fields(exam_name, build)
+
+    def _on_query_tree_scroll(self, scrollbar, first, last):
+        """同步滚动条，可见区域接近已加载数据末尾时加载下一页"""
+        scrollbar.set(first, last)
+        if float(last) > 0.9:
+            self.root.after_idle(self._load_next_page)
+
+    def _get_custom_fields(self, exam_name, on_done):
+        """读取考试的自定义学科列表并交给 on_done：已缓存时立即调用，否则在后台查询"""
+        custom_fields = self.cache.get(('fields', exam_name))
+        if custom_fields is not None:
+            on_done(custom_fields)
+            return
+
+        generation = self.cache.generation
+
+        def on_fetched(custom_fields):
+            self.cache.put(('fields', exam_name), custom_fields, generation)
+            on_done(custom_fields)
+
+        def on_error(error):
+            messagebox.showerror("错误", f"读取自定义学科失败: {str(error)}，请稍后再试。")
+
+        self.db_worker.submit(fetch_exam_custom_fields, exam_name, on_done=on_fetched, on_error=on_error)
+
+    def _load_data(self, exam_name, sort_option, filters=None, with_ranks=False):
+        """加载查询数据（后台按页读取，首屏之外的行在滚动时才加载）
+
+        表格中已有的行保留到首页结果返回，再只更新有变化的行，搜索时表格不会闪烁。
+        """
+        if self.query_state and self.query_state['job']:
+            self.query_state['job'].cancel()
+
+        state = {
+            'exam_name': exam_name,
+            'sort_option': sort_option,
+            'filters': filters,
+            'with_ranks': with_ranks,
+            'custom_fields': [],
+            'loaded': 0,
+            'total': 0,
+            'job': None,
+        }
+        self.query_state = state
+
+        # 首页已缓存时直接显示，无需访问数据库
+        custom_fields = self.cache.get(('fields', exam_name))
+        total = self.cache.get(('count', exam_name, filters))
+        page = self.cache.get(('page', exam_name, sort_option, 0, filters, with_ranks))
+        if custom_fields is not None and total is not None and page is not None:
+            state['custom_fields'], state['total'] = custom_fields, total
+            self._replace_query_rows(state, page)
+            return
+
+        generation = self.cache.generation
+
+        def load_first_page(conn):
+            # 自定义学科与筛选条件无关，已缓存时搜索只需查询人数和首页
+            fields = custom_fields if custom_fields is not None else fetch_exam_custom_fields(conn, exam_name)
+            count = total if total is not None else count_exam_students(conn, exam_name, filters)
+            return fields, count, fetch_student_page(conn, exam_name, sort_option, 0, QUERY_PAGE_SIZE, filters,
+                                                     with_ranks)
+
+        def on_done(result):
+            state['custom_fields'], state['total'], page = result
+            self.cache.put(('fields', exam_name), state['custom_fields'], generation)
+            self.cache.put(('count', exam_name, filters), state['total'], generation)
+            self.cache.put(('page', exam_name, sort_option, 0, filters, with_ranks), page, generation)
+            self._replace_query_rows(state, page)
+
+        self._start_query_job(state, self.db_worker.submit(load_first_page, on_done=on_done,
+                                                           on_error=lambda e: self._on_query_job_error(state, e)))
+
+    def _load_next_page(self):
+        """后台读取查询结果的下一页并追加到表格末尾"""
+        state = self.query_state
+        if not state or state['job'] or state['loaded'] >= state['total']:
+            return
 
-        self.tree.bind("<Button-1>", lambda event: self._handle_query_tree_click(event, self.tree))
-
-    def _load_data(self, exam_name, sort_option):
-        """加载查询数据"""
-        # 查询该考试下的所有自定义学科
-        self.cursor.execute("""
-            SELECT DISTINCT field_name 
-            FROM student_fields 
-            JOIN students ON student_fields.student_id = students.id 
-            WHERE students.exam_name = ?
-        """, (exam_name,))
-        custom_fields = [row[0] for row in self.cursor.fetchall()]
-
-        # 构建排序SQL
-        sort_sql = ""
-        if sort_option == "总成绩从高到低":
-            sort_sql = "ORDER BY (CASE WHEN chinese = '无' THEN 0 ELSE chinese END + CASE WHEN math = '无' THEN 0 ELSE math END + CASE WHEN english = '无' THEN 0 ELSE english END) DESC"
-        elif sort_option == "总成绩从低到高":
-            sort_sql = "ORDER BY (CASE WHEN chinese = '无' THEN 0 ELSE chinese END + CASE WHEN math = '无' THEN 0 ELSE math END + CASE WHEN english = '无' THEN 0 ELSE english END) ASC"
-        elif sort_option == "语文成绩从高到低":
-            sort_sql = "ORDER BY CASE WHEN chinese = '无' THEN 0 ELSE chinese END DESC"
-        elif sort_option == "语文成绩从低到高":
-            sort_sql = "ORDER BY CASE WHEN chinese = '无' THEN 0 ELSE chinese END ASC"
-        elif sort_option == "数学成绩从高到低":
-            sort_sql = "ORDER BY CASE WHEN math = '无' THEN 0 ELSE math END DESC"
-        elif sort_option == "数学成绩从低到高":
-            sort_sql = "ORDER BY CASE WHEN math = '无' THEN 0 ELSE math END ASC"
-        elif sort_option == "英语成绩从高到低":
-            sort_sql = "ORDER BY CASE WHEN english = '无' THEN 0 ELSE english END DESC"
-        elif sort_option == "英语成绩从低到高":
-            sort_sql = "ORDER BY CASE WHEN english = '无' THEN 0 ELSE english END ASC"
-
-        # 查询学生信息
-        self.cursor.execute(f"""
-            SELECT students.id, students.name, students.chinese, students.math, students.english
-            FROM students
-            WHERE students.exam_name = ?
-            {sort_sql}
-        """, (exam_name,))
-        students = self.cursor.fetchall()
-
-        # 清空表格
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        for student in students:
-            student_id = student[0]
-            # 查询该学生的自定义学科成绩
-            self.cursor.execute("""
-                SELECT field_name, field_value 
-                FROM student_fields 
-                WHERE student_id = ?
-            """, (student_id,))
-            custom_scores = {row[0]: row[1] for row in self.cursor.fetchall()}
-
-            values = list(student)
-            for field in custom_fields:
-                values.append(custom_scores.get(field, "无"))
-            values.append("修改     |     删除")
-            self.tree.insert("", tk.END, values=values, iid=student_id)
+        key = ('page', state['exam_name'], state['sort_option'], state['loaded'], state['filters'],
+               state['with_ranks'])
+        page = self.cache.get(key)
+        if page is not None:
+            self._append_query_rows(state, page)
+            return
+
+        generation = self.cache.generation
+
+        def on_done(page):
+            self.cache.put(key, page, generation)
+            self._append_query_rows(state, page)
+
+        job = self.db_worker.submit(fetch_student_page, state['exam_name'], state['sort_option'], state['loaded'],
+                                    QUERY_PAGE_SIZE, state['filters'], state['with_ranks'],
+                                    on_done=on_done, on_error=lambda e: self._on_query_job_error(state, e))
+        self._start_query_job(state, job)
+
+    def _start_query_job(self, state, job):
+        """记录正在执行的查询任务并显示加载状态"""
+        state['job'] = job
+        self.query_status_label.config(text=f"正在加载... 已加载 {state['loaded']} 条")
+        self.query_cancel_btn.pack(side=tk.LEFT, padx=10)
+
+    def _finish_query_job(self, state):
+        """查询任务结束，隐藏加载状态"""
+        state['job'] = None
+        if self.query_status_label.winfo_exists():
+            self.query_status_label.config(text=f"已加载 {state['loaded']} / {state['total']} 条")
+            self.query_cancel_btn.pack_forget()
+
+    def _cancel_query_job(self):
+        """取消正在加载的查询"""
+        state = self.query_state
+        if state and state['job']:
+            state['job'].cancel()
+            # 取消后不再自动加载后续页面
+            state['total'] = state['loaded']
+            self._clear_stale_query_rows(state)
+            self._finish_query_job(state)
+
+    def _on_query_job_error(self, state, error):
+        """查询任务失败"""
+        self._clear_stale_query_rows(state)
+        self._finish_query_job(state)
+        messagebox.showerror("错误", f"查询失败: {str(error)}，请稍后再试。")
+
+    def _clear_stale_query_rows(self, state):
+        """首页尚未返回时，表格中仍是上一次查询的结果，清空以免与当前条件不符"""
+        if state is self.query_state and state['loaded'] == 0 and self.tree.winfo_exists():
+            self.tree.delete(*self.tree.get_children())
+            self.query_rows.clear()
+
+    def _replace_query_rows(self, state, page):
+        """用首页结果替换表格内容：只删除、插入、更新或移动有变化的行"""
+        if state is not self.query_state or not self.tree.winfo_exists():
+            return
+
+        new_rows = {str(student[0]): self._query_row_values(state, student, custom_scores)
+                    for student, custom_scores in page}
+        stale = [iid for iid in self.tree.get_children() if iid not in new_rows]
+        if stale:
+            self.tree.delete(*stale)
+        for iid in stale:
+            self.query_rows.pop(iid, None)
+
+        children = list(self.tree.get_children())
+        for index, (iid, values) in enumerate(new_rows.items()):
+            if iid not in self.query_rows:
+                self.tree.insert("", index, values=values, iid=iid)
+                children.insert(index, iid)
+            else:
+                if self.query_rows[iid] != values:
+                    self.tree.item(iid, values=values)
+                if children[index] != iid:
+                    self.tree.move(iid, "", index)
+                    children.remove(iid)
+                    children.insert(index, iid)
+            self.query_rows[iid] = values
+
+        state['loaded'] = len(page)
+        if len(page) < QUERY_PAGE_SIZE:
+            state['total'] = state['loaded']
+        self._finish_query_job(state)
+
+    def _append_query_rows(self, state, page):
+        """将后台读取到的一页学生追加到表格末尾"""
+        if state is not self.query_state or not self.tree.winfo_exists():
+            return
+
+        for student, custom_scores in page:
+            # 加载期间数据有变化时，按偏移读取的下一页可能包含已显示的学生，跳过
+            if self.tree.exists(student[0]):
+                continue
+            values = self._query_row_values(state, student, custom_scores)
+            self.tree.insert("", tk.END, values=values, iid=student[0])
+            self.query_rows[str(student[0])] = values
+
+        state['loaded'] += len(page)
+        if len(page) < QUERY_PAGE_SIZE:
+            # 数据在加载期间被删除时，以实际读取到的行数为准
+            state['total'] = state['loaded']
+        self._finish_query_job(state)
+
+    def _query_row_values(self, state, student, custom_scores):
+        """生成查询表格中一行的显示值"""
+        values = [student[0], student[1]] + [format_score(score) for score in student[2:5]]
+        for field in state['custom_fields']:
+            values.append(custom_scores.get(field, MISSING_SCORE))
+        values.append(format_score(student[5]))
+        if state['with_ranks']:
+            for kind, value in zip(itertools.cycle(RANK_KINDS), student[6:]):
+                if value is None:
+                    values.append(MISSING_SCORE)
+                elif kind == 'percentile':
+                    values.append(f"{value:.1%}")
+                else:
+                    values.append(value)
+        values.append("修改     |     删除")
+        return values
+
+    def _refresh_query_row(self, student_id):
+        """修改学生后只刷新查询表格中的这一行；表格需要新增列时返回 False，由调用方重建整个页面"""
+        state = self.query_state
+        if not state or not self.tree.winfo_exists() or not self.tree.exists(student_id):
+            return True
+
+        info = fetch_student_info(self.conn, student_id)
+        if info is None or info.exam_name != state['exam_name']:
+            # 学生已不属于当前考试
+            self.tree.delete(student_id)
+            self.query_rows.pop(str(student_id), None)
+            state['loaded'] -= 1
+            state['total'] -= 1
+            if not state['job']:
+                self._finish_query_job(state)
+            return True
+
+        if state['with_ranks']:
+            # 一名学生的成绩变化会影响其他学生的排名，重新读取首页（只更新有变化的行）
+            self._load_data(state['exam_name'], state['sort_option'], state['filters'], True)
+            return True
+
+        student, custom_scores = fetch_student(self.conn, student_id)
+        if any(field not in state['custom_fields'] for field in custom_scores):
+            return False
+        values = self._query_row_values(state, student, custom_scores)
+
+        # 排序列或筛选条件涉及的列有变化时，这名学生在结果中的位置（或是否符合条件）随之改变，
+        # 已加载的行数不再对应新顺序下的偏移，重新读取首页（只更新有变化的行）
+        column_index = {'name': 1, 'chinese': 2, 'math': 3, 'english': 4,
+                        'total_score': 5 + len(state['custom_fields'])}
+        affected = {SORT_OPTIONS.get(state['sort_option'], ('id',))[0]}
+        if state['filters']:
+            name_prefix, ranges = state['filters']
+            if name_prefix:
+                affected.add('name')
+            affected.update(column for column, _, _ in ranges)
+        old_values = self.query_rows.get(str(student_id))
+        if old_values is None or any(old_values[column_index[column]] != values[column_index[column]]
+                                     for column in affected if column in column_index):
+            self._load_data(state['exam_name'], state['sort_option'], state['filters'])
+            return True
+
+        self.tree.item(student_id, values=values)
+        self.query_rows[str(student_id)] = values
+        return True
 
     def _handle_query_tree_click(self, event, tree):
         """处理查询表格点击事件"""
@@ -964,17 +1774,12 @@ class StudentSystem:
 
     def _modify_student(self, student_id):
         """修改学生信息"""
-        self.cursor.execute("SELECT name, chinese, math, english, exam_name FROM students WHERE id=?", (student_id,))
-        student = self.cursor.fetchone()
+        student = fetch_student_info(self.conn, student_id)
         name, chinese, math, english, exam_name = student
+        chinese, math, english = format_score(chinese), format_score(math), format_score(english)
 
         # 查询该学生的自定义学科成绩
-        self.cursor.execute("""
-            SELECT field_name, field_value 
-            FROM student_fields 
-            WHERE student_id = ?
-        """, (student_id,))
-        custom_scores = {row[0]: row[1] for row in self.cursor.fetchall()}
+        custom_scores = fetch_custom_scores(self.conn, [student_id]).get(int(student_id), {})
 
         modify_window = tk.Toplevel(self.root)
         modify_window.title("修改学生信息")
@@ -1004,6 +1809,20 @@ class StudentSystem:
         name_entry.insert(0, name)
         name_entry.pack(side=tk.LEFT, padx=10, fill=tk.X, expand=True)
 
+        # 学生身份行：成绩趋势按身份跨考试关联，同名的不同学生在这里区分
+        current_pupil = fetch_student_pupil(self.conn, student_id)
+        pupil_options = {"按姓名自动关联": None}
+        for pupil in fetch_pupils(self.conn, name):
+            label = f"与 #{pupil.id}（参加过: {pupil.exam_names or '无'}）为同一人"
+            pupil_options[label + "（当前）" if pupil.id == current_pupil else label] = pupil.id
+        pupil_options["另一名同名学生（新建身份）"] = NEW_PUPIL
+        pupil_frame = tk.Frame(basic_frame, bg=BG_COLOR)
+        pupil_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(pupil_frame, text="学生身份:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT, padx=10)
+        pupil_var = tk.StringVar(value="按姓名自动关联")
+        ttk.Combobox(pupil_frame, textvariable=pupil_var, values=list(pupil_options), state='readonly',
+                     width=60).pack(side=tk.LEFT, padx=10)
+
         # 成绩行1
         score_frame1 = tk.Frame(basic_frame, bg=BG_COLOR)
         score_frame1.pack(fill=tk.X, padx=10, pady=5)
@@ -1043,7 +1862,8 @@ class StudentSystem:
             remove_button = tk.Button(
                 field_frame,
                 text="删除",
-                command=lambda name=field_name, frame=field_frame: self.remove_dynamic_field(name, frame),
+                command=lambda name=field_name, frame=field_frame: self.remove_dynamic_field_modify(
+                    name, frame, dynamic_field_entries),
                 bg='#E74C3C',
                 fg=BTN_FG_COLOR,
                 font=('Microsoft YaHei', 9),
@@ -1078,7 +1898,7 @@ class StudentSystem:
         )
         add_button.pack(side=tk.LEFT, padx=10)
 
-        def update_student():
+        def save_student():
             new_exam_name = exam_name_var.get()
             new_name = name_entry.get().strip()
             new_chinese = chinese_entry.get().strip()
@@ -1090,53 +1910,39 @@ class StudentSystem:
                 messagebox.showerror("错误", "姓名不能为空，请输入学生姓名。")
                 return
 
-            # 将空白项设置为“无”
-            if not new_chinese:
-                new_chinese = "无"
-            if not new_math:
-                new_math = "无"
-            if not new_english:
-                new_english = "无"
-
+            # 空白项按缺考处理（存储为 NULL，显示为“无”）
             try:
-                if new_chinese != "无":
-                    new_chinese = float(new_chinese)
-                if new_math != "无":
-                    new_math = float(new_math)
-                if new_english != "无":
-                    new_english = float(new_english)
+                new_chinese = parse_score(new_chinese)
+                new_math = parse_score(new_math)
+                new_english = parse_score(new_english)
             except ValueError:
                 messagebox.showerror("错误", "成绩必须为数字，请输入有效的成绩。")
                 return
 
+            # 与打开对话框时的快照比较，只写入有变化的部分
+            new_custom_scores = {}
+            for field_name, _, field_entry in dynamic_field_entries:
+                field_value = field_entry.get().strip()
+                if field_name.strip() and field_value:
+                    new_custom_scores[field_name.strip()] = field_value
+            removed_fields = [field for field in custom_scores if field not in new_custom_scores]
+            changed_fields = {field: value for field, value in new_custom_scores.items()
+                              if custom_scores.get(field) != value}
+            new_student = StudentInfo(new_name, new_chinese, new_math, new_english, new_exam_name)
+
             try:
-                self.conn.execute("BEGIN")
-
-                # 更新学生信息
-                self.cursor.execute("""
-                    UPDATE students 
-                    SET name=?, chinese=?, math=?, english=?, exam_name=? 
-                    WHERE id=?
-                """, (new_name, new_chinese, new_math, new_english, new_exam_name, student_id))
-
-                # 删除原有的自定义学科成绩
-                self.cursor.execute("DELETE FROM student_fields WHERE student_id=?", (student_id,))
-
-                # 添加新的自定义学科成绩
-                for field_name, _, field_entry in dynamic_field_entries:
-                    field_value = field_entry.get().strip()
-                    if field_name.strip() and field_value.strip():
-                        self.cursor.execute(
-                            "INSERT INTO student_fields (student_id, field_name, field_value) VALUES (?, ?, ?)",
-                            (student_id, field_name.strip(), field_value.strip()))
-
-                self.conn.commit()
+                # 目标考试不存在时自动创建
+                update_student(self.conn, student_id, new_student if new_student != student else None,
+                               removed_fields, changed_fields, pupil_options[pupil_var.get()])
+                self.cache.invalidate(exam_name, new_exam_name)
+                self._load_exam_names()
+                self._audit(f"修改学生 {name} → {new_name}（{exam_name} → {new_exam_name}）")
                 messagebox.showinfo("成功", f"学生 {new_name} 的信息已更新。")
                 modify_window.destroy()
-                self._show_query_page()
+                if not self._refresh_query_row(student_id):
+                    self._show_query_page()
 
             except sqlite3.Error as e:
-                self.conn.execute("ROLLBACK")
                 messagebox.showerror("错误", f"操作失败: {str(e)}，请稍后再试。")
 
         btn_frame = tk.Frame(frame, bg=BG_COLOR)
@@ -1145,7 +1951,7 @@ class StudentSystem:
         submit_btn = tk.Button(
             btn_frame,
             text="提交",
-            command=update_student,
+            command=save_student,
             bg=BTN_BG_COLOR,
             fg=BTN_FG_COLOR,
             font=HEADER_FONT,
@@ -1190,7 +1996,8 @@ class StudentSystem:
         remove_button = tk.Button(
             field_frame,
             text="删除",
-            command=lambda name=field_name, frame=field_frame: self.remove_dynamic_field(name, frame),
+            command=lambda name=field_name, frame=field_frame: self.remove_dynamic_field_modify(
+                name, frame, dynamic_field_entries),
             bg='#E74C3C',
             fg=BTN_FG_COLOR,
             font=('Microsoft YaHei', 9),
@@ -1207,27 +2014,26 @@ class StudentSystem:
         new_field_value.delete(0, tk.END)
         new_field_name.focus()
 
+    def remove_dynamic_field_modify(self, field_name, frame, dynamic_field_entries):
+        """删除动态字段（修改页面）"""
+        frame.destroy()
+        dynamic_field_entries[:] = [entry for entry in dynamic_field_entries if entry[0] != field_name]
+
     def _delete_student(self, student_id):
         """删除学生信息"""
-        self.cursor.execute("SELECT name FROM students WHERE id=?", (student_id,))
-        name = self.cursor.fetchone()[0]
+        student = fetch_student_info(self.conn, student_id)
+        name, exam_name = student.name, student.exam_name
 
         if messagebox.askyesno("确认", f"确定要删除学生 {name} 的信息吗？此操作不可恢复。"):
             try:
-                self.conn.execute("BEGIN")
-
-                # 删除学生的自定义学科成绩
-                self.cursor.execute("DELETE FROM student_fields WHERE student_id=?", (student_id,))
-
-                # 删除学生信息
-                self.cursor.execute("DELETE FROM students WHERE id=?", (student_id,))
-
-                self.conn.commit()
+                # 外键级联删除学生的自定义学科成绩
+                delete_student(self.conn, student_id)
+                self.cache.invalidate(exam_name)
+                self._audit(f"删除学生 {name}（{exam_name}）")
                 messagebox.showinfo("成功", f"学生 {name} 的信息已删除。")
                 self._show_query_page()
 
             except sqlite3.Error as e:
-                self.conn.execute("ROLLBACK")
                 messagebox.showerror("错误", f"操作失败: {str(e)}，请稍后再试。")
 
     def _show_exam_management_page(self):
@@ -1244,10 +2050,8 @@ class StudentSystem:
         exam_listbox.pack(fill=tk.BOTH, expand=True, pady=10)
 
         # 加载考试列表
-        self.cursor.execute("SELECT exam_name FROM exams")
-        exams = self.cursor.fetchall()
-        for exam in exams:
-            exam_listbox.insert(tk.END, exam[0])
+        for exam_name in fetch_exam_names(self.conn):
+            exam_listbox.insert(tk.END, exam_name)
 
         # 操作按钮
         btn_frame = tk.Frame(frame, bg=BG_COLOR)
@@ -1257,6 +2061,26 @@ class StudentSystem:
                   bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
         tk.Button(btn_frame, text="删除考试", command=lambda: self._delete_exam(exam_listbox),
                   bg='#E74C3C', fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+        tk.Button(btn_frame, text="数据库维护", command=lambda: self._run_maintenance(frame),
+                  bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+
+    def _run_maintenance(self, frame):
+        """在后台清理孤立数据、重建学科汇总并压缩数据库"""
+        def on_done(result):
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+            self.cache.clear()
+            messagebox.showinfo("成功", f"已清理孤立学生 {result['orphan_students']} 名、"
+                                      f"孤立成绩 {result['orphan_fields']} 条，重建学科汇总，"
+                                      f"回收 {result['free_pages']} 个空闲页。")
+
+        def on_error(error):
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+            messagebox.showerror("错误", f"维护失败: {str(error)}，请稍后再试。")
+
+        job = self.db_worker.submit(run_maintenance, on_done=on_done, on_error=on_error)
+        busy_frame = self._show_busy(frame, "正在维护数据库...", job)
 
     def _show_add_exam_dialog(self):
         """显示添加考试对话框"""
@@ -1279,9 +2103,9 @@ class StudentSystem:
                 messagebox.showerror("错误", "考试名称不能为空，请输入有效的考试名称。")
                 return
             try:
-                self.cursor.execute("INSERT INTO exams (exam_name) VALUES (?)", (exam_name,))
-                self.conn.commit()
+                create_exam(self.conn, exam_name)
                 self._load_exam_names()
+                self._audit(f"创建考试 {exam_name}")
                 messagebox.showinfo("成功", f"考试 {exam_name} 创建成功。")
                 add_exam_window.destroy()
                 self._show_exam_management_page()
@@ -1306,15 +2130,28 @@ class StudentSystem:
             return
 
         exam_name = exam_listbox.get(selected_index)
-        if messagebox.askyesno("确认", f"确定要删除考试 {exam_name} 吗？此操作不可恢复。"):
-            try:
-                self.cursor.execute("DELETE FROM exams WHERE exam_name = ?", (exam_name,))
-                self.conn.commit()
-                self._load_exam_names()
-                messagebox.showinfo("成功", f"考试 {exam_name} 已删除。")
+        if not messagebox.askyesno("确认", f"确定要删除考试 {exam_name} 吗？此操作不可恢复。"):
+            return
+
+        def on_done(students):
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+            self.cache.invalidate(exam_name)
+            # 在后台回收删除后产生的空闲页
+            self.db_worker.submit(compact_db)
+            self._load_exam_names()
+            self._audit(f"删除考试 {exam_name}")
+            messagebox.showinfo("成功", f"考试 {exam_name} 已删除。")
+            if exam_listbox.winfo_exists():
                 self._show_exam_management_page()
-            except Exception as e:
-                messagebox.showerror("错误", f"删除失败: {str(e)}，请稍后再试。")
+
+        def on_error(error):
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+            messagebox.showerror("错误", f"删除失败: {str(error)}，请稍后再试。")
+
+        job = self.db_worker.submit(delete_exam, exam_name, on_done=on_done, on_error=on_error)
+        busy_frame = self._show_busy(exam_listbox.master, f"正在删除考试 {exam_name}...", job)
 
     def _show_statistics_page(self):
         """显示数据统计页面"""
@@ -1334,90 +2171,187 @@ class StudentSystem:
 
         # 查询按钮
         query_btn = tk.Button(frame, text="查询统计数据",
-                              command=lambda: self._show_statistics(exam_name_var.get(), frame),
+                              command=lambda: self._show_statistics(exam_name_var.get(), chart),
                               bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT)
         query_btn.pack(pady=20)
 
-    def _show_statistics(self, exam_name, frame):
-        """显示统计数据和图表"""
-        # 查询该考试下的所有自定义学科
-        self.cursor.execute("""
-            SELECT DISTINCT field_name 
-            FROM student_fields 
-            JOIN students ON student_fields.student_id = students.id 
-            WHERE students.exam_name = ?
-        """, (exam_name,))
-        custom_fields = [row[0] for row in self.cursor.fetchall()]
-
-        # 查询学生信息
-        self.cursor.execute("""
-            SELECT students.id, students.name, students.chinese, students.math, students.english
-            FROM students
-            WHERE students.exam_name = ?
-        """, (exam_name,))
-        students = self.cursor.fetchall()
-
-        scores = {
-            'chinese': [],
-            'math': [],
-            'english': []
-        }
-        for field in custom_fields:
-            scores[field] = []
-
-        for student in students:
-            student_id = student[0]
-            chinese = student[2] if student[2] != "无" else 0
-            math = student[3] if student[3] != "无" else 0
-            english = student[4] if student[4] != "无" else 0
-
-            scores['chinese'].append(float(chinese))
-            scores['math'].append(float(math))
-            scores['english'].append(float(english))
-
-            # 查询该学生的自定义学科成绩
-            self.cursor.execute("""
-                SELECT field_name, field_value 
-                FROM student_fields 
-                WHERE student_id = ?
-            """, (student_id,))
-            custom_scores = {row[0]: row[1] for row in self.cursor.fetchall()}
-            for field in custom_fields:
-                score = custom_scores.get(field, 0)
-                scores[field].append(float(score) if score != "无" else 0)
+        # 学生跨考试成绩趋势
+        trend_frame = tk.Frame(frame, bg=BG_COLOR)
+        trend_frame.pack(pady=5)
+        tk.Label(trend_frame, text="学生姓名:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+        trend_name_entry = tk.Entry(trend_frame, font=FONT, bd=1, relief=tk.SOLID, width=15)
+        trend_name_entry.pack(side=tk.LEFT, padx=10)
+        tk.Label(trend_frame, text="学科:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+        column_by_label = {label: column for column, label in SCORE_COLUMNS.items()}
+        trend_column_var = tk.StringVar(value=SCORE_COLUMNS['total_score'])
+        ttk.Combobox(trend_frame, textvariable=trend_column_var, values=list(column_by_label),
+                     state='readonly', width=8).pack(side=tk.LEFT, padx=10)
+        tk.Button(trend_frame, text="查看成绩趋势",
+                  command=lambda: self._show_trend(trend_name_entry.get().strip(),
+                                                   column_by_label[trend_column_var.get()], chart),
+                  bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+
+        # 统计结果和图表，每次查询都在这里原地更新
+        chart = StatisticsChart(frame)
+
+    def _show_busy(self, parent, text, job, before=None):
+        """在 parent 中（before 之前）显示加载提示和取消按钮，返回提示所在的 Frame，任务结束后由调用方销毁"""
+        busy_frame = tk.Frame(parent, bg=BG_COLOR)
+        busy_frame.pack(pady=10, anchor=tk.W, before=before)
+        tk.Label(busy_frame, text=text, font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+
+        def cancel():
+            job.cancel()
+            busy_frame.destroy()
+
+        tk.Button(busy_frame, text="取消", command=cancel,
+                  bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+        return busy_frame
+
+    def _show_statistics(self, exam_name, chart):
+        """在后台读取学科汇总（优先使用缓存），完成后在 chart 中显示统计数据和图表"""
+        statistics = self.cache.get(('stats', exam_name))
+        if statistics is not None:
+            self._render_statistics(exam_name, chart, statistics)
+            return
 
+        generation = self.cache.generation
+
+        def on_done(statistics):
+            self.cache.put(('stats', exam_name), statistics, generation)
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+                self._render_statistics(exam_name, chart, statistics)
+
+        def on_error(error):
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+            messagebox.showerror("错误", f"统计失败: {str(error)}，请稍后再试。")
+
+        job = self.db_worker.submit(fetch_subject_stats, exam_name, on_done=on_done, on_error=on_error)
+        busy_frame = self._show_busy(chart.frame.master, "正在统计...", job, before=chart.frame)
+
+    def _render_statistics(self, exam_name, chart, statistics):
+        """显示统计数据和图表"""
         # 处理没有学生数据的情况
-        if not students:
-            tk.Label(frame, text="该考试暂无学生数据", font=HEADER_FONT, bg=BG_COLOR).pack(pady=20)
+        if not statistics:
+            chart.show_message("该考试暂无学生数据")
             return
 
-        # 统计信息
+        # 统计信息，百分位数计算完成后再补充
+        chart.show_statistics(exam_name, statistics, self._statistics_text(exam_name, statistics, None))
+        self._load_percentiles(exam_name, statistics, chart)
+
+    def _statistics_text(self, exam_name, statistics, percentiles):
+        """统计数据的文字说明；percentiles 为 None 表示百分位数尚在计算"""
         stats_text = f"考试名称: {exam_name}\n"
-        for subject, subject_scores in scores.items():
-            if subject_scores:
-                average = sum(subject_scores) / len(subject_scores)
-                max_score = max(subject_scores)
-                min_score = min(subject_scores)
-                stats_text += f"{subject} 平均分: {average:.2f}, 最高分: {max_score}, 最低分: {min_score}\n"
-
-        stats_label = tk.Label(frame, text=stats_text, font=FONT, bg=BG_COLOR, justify=tk.LEFT)
-        stats_label.pack(pady=20, anchor=tk.W)
-
-        # 绘制柱状图
-        fig = Figure(figsize=(8, 5), dpi=100)
-        ax = fig.add_subplot(111)
-        subjects = list(scores.keys())
-        averages = [sum(scores[subject]) / len(scores[subject]) if scores[subject] else 0 for subject in subjects]
-        ax.bar(subjects, averages, color=['#3498db', '#2ecc71', '#e74c3c', '#f39c12', '#9b59b6'])
-        ax.set_xlabel('学科', fontsize=12)
-        ax.set_ylabel('平均分', fontsize=12)
-        ax.set_title(f'{exam_name} 各学科平均分', fontsize=14)
-        ax.tick_params(axis='x', rotation=45)  # 学科名称旋转45度避免重叠
-        fig.tight_layout()  # 自动调整布局
+        for subject_id, label, stats in statistics:
+            if percentiles is None:
+                percentile_text = "百分位数计算中..."
+            else:
+                subject_percentiles = percentiles.get(subject_id, {})
+                percentile_text = ", ".join(f"P{p}: {subject_percentiles[f'p{p}']:.2f}" for p in STAT_PERCENTILES
+                                            if f'p{p}' in subject_percentiles)
+            stats_text += (f"{label} 人数: {stats['count']}, "
+                           f"平均分: {stats['mean']:.2f}, 最高分: {format_score(stats['max'])}, "
+                           f"最低分: {format_score(stats['min'])}, "
+                           f"标准差: {stats['std']:.2f}, {percentile_text}\n")
+        return stats_text
+
+    def _load_percentiles(self, exam_name, statistics, chart):
+        """百分位数需要排序全部成绩，在后台计算（优先使用缓存），完成后补充到统计文字中"""
+        percentiles = self.cache.get(('percentiles', exam_name))
+        if percentiles is not None:
+            chart.set_text(self._statistics_text(exam_name, statistics, percentiles))
+            return
+
+        generation = self.cache.generation
+        showing = chart.showing
+
+        def on_done(percentiles):
+            self.cache.put(('percentiles', exam_name), percentiles, generation)
+            # 计算期间可能已切换到别的考试或趋势图
+            if chart.label.winfo_exists() and chart.showing == showing:
+                chart.set_text(self._statistics_text(exam_name, statistics, percentiles))
 
-        canvas = FigureCanvasTkAgg(fig, master=frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(pady=20, fill=tk.BOTH, expand=True)
+        def on_error(error):
+            if chart.label.winfo_exists() and chart.showing == showing:
+                chart.set_text(self._statistics_text(exam_name, statistics, {}))
+            messagebox.showerror("错误", f"计算百分位数失败: {str(error)}，请稍后再试。")
+
+        self.db_worker.submit(compute_exam_percentiles, exam_name, on_done=on_done, on_error=on_error)
+
+    def _show_trend(self, student_name, column, chart, pupil_id=None):
+        """在后台查询学生各次考试的成绩走势，完成后在 chart 中绘制折线图
+
+        未指定身份且有多名同名学生时，先让用户选择查看哪一名。
+        """
+        if not student_name:
+            messagebox.showerror("错误", "请输入学生姓名。")
+            return
+
+        def load_trend(conn):
+            pupils = fetch_pupils(conn, student_name) if pupil_id is None else []
+            if pupil_id is None and len(pupils) != 1:
+                return pupils, None
+            return pupils, compute_student_trend(conn, pupil_id or pupils[0].id, column)
+
+        def on_done(result):
+            if not busy_frame.winfo_exists():
+                return
+            busy_frame.destroy()
+            pupils, trend = result
+            if trend is None and pupils:
+                self._choose_pupil(pupils, lambda pupil: self._show_trend(student_name, column, chart, pupil.id))
+            else:
+                self._render_trend(student_name, column, chart, trend or [])
+
+        def on_error(error):
+            if busy_frame.winfo_exists():
+                busy_frame.destroy()
+            messagebox.showerror("错误", f"查询成绩趋势失败: {str(error)}，请稍后再试。")
+
+        job = self.db_worker.submit(load_trend, on_done=on_done, on_error=on_error)
+        busy_frame = self._show_busy(chart.frame.master, "正在查询成绩趋势...", job, before=chart.frame)
+
+    def _choose_pupil(self, pupils, on_choose):
+        """有多名同名学生时弹出列表，选择后以所选身份（Pupil）调用 on_choose"""
+        window = tk.Toplevel(self.root)
+        window.title("选择学生")
+        self.center_window(window, 500, 300)
+        window.grab_set()
+        window.configure(bg=BG_COLOR)
+
+        tk.Label(window, text=f"有 {len(pupils)} 名学生叫 {pupils[0].name}，请选择:", font=HEADER_FONT,
+                 bg=BG_COLOR).pack(anchor=tk.W, padx=20, pady=10)
+        listbox = tk.Listbox(window, font=FONT, bd=1, relief=tk.SOLID)
+        for pupil in pupils:
+            listbox.insert(tk.END, f"#{pupil.id} 参加过: {pupil.exam_names or '无'}")
+        listbox.selection_set(0)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=20)
+
+        def choose():
+            selection = listbox.curselection()
+            if selection:
+                window.destroy()
+                on_choose(pupils[selection[0]])
+
+        listbox.bind('<Double-Button-1>', lambda event: choose())
+        tk.Button(window, text="查看", command=choose,
+                  bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(pady=10)
+
+    def _render_trend(self, student_name, column, chart, trend):
+        """绘制学生成绩与考试平均分随考试变化的折线图"""
+        if not trend:
+            chart.show_message(f"未找到学生 {student_name} 的成绩")
+            return
+
+        chart.show_trend(student_name, column, trend)
+        # 同一场考试有多条记录关联到该学生时不取平均，该点空缺，提示用户区分同名学生
+        ambiguous = [point.exam_name for point in trend if point.matches > 1]
+        if ambiguous:
+            messagebox.showwarning("提示", f"以下考试中有多条记录关联到学生 {student_name}，无法确定成绩，图中未显示:\n"
+                                         f"{'、'.join(ambiguous)}\n如果是同名的不同学生，请在修改学生时选择“另一名同名学生”。")
 
     def _export_data(self):
         """导出数据到 Excel"""
@@ -1425,38 +2359,177 @@ class StudentSystem:
         if not file_path:
             return
 
-        try:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "学生信息"
-
-            # 写入表头
-            headers = ['姓名', '语文', '数学', '英语']
-            self.cursor.execute("SELECT DISTINCT field_name FROM student_fields")
-            custom_fields = [row[0] for row in self.cursor.fetchall()]
-            headers.extend(custom_fields)
-            ws.append(headers)
-
-            # 写入数据
-            self.cursor.execute("SELECT id, name, chinese, math, english FROM students")
-            students = self.cursor.fetchall()
-            for student_id, name, chinese, math, english in students:
-                self.cursor.execute("""
-                    SELECT field_name, field_value FROM student_fields 
-                    WHERE student_id = ?
-                """, (student_id,))
-                custom_data = {row[0]: row[1] for row in self.cursor.fetchall()}
-
-                row = [name, chinese, math, english]
-                for field in custom_fields:
-                    row.append(custom_data.get(field, "无"))
-
-                ws.append(row)
-
-            wb.save(file_path)
+        # 进度窗口
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("导出数据")
+        self.center_window(progress_window, 400, 160)
+        progress_window.resizable(False, False)
+        progress_window.grab_set()
+        progress_window.configure(bg=BG_COLOR)
+
+        progress_label = tk.Label(progress_window, text="正在导出...", font=FONT, bg=BG_COLOR)
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(progress_window, length=340, mode='determinate')
+        progress_bar.pack(pady=10)
+
+        def on_progress(done, total):
+            progress_bar['maximum'] = max(total, 1)
+            progress_bar['value'] = done
+            progress_label.config(text=f"正在导出... {done} / {total}")
+
+        def on_done(exported):
+            progress_window.destroy()
+            self._audit(f"导出学生 {exported} 名（{file_path}）")
             messagebox.showinfo("成功", f"数据已导出到 {file_path}。")
-        except Exception as e:
-            messagebox.showerror("错误", f"导出失败: {str(e)}，请稍后再试。")
+
+        def on_error(error):
+            progress_window.destroy()
+            messagebox.showerror("错误", f"导出失败: {str(error)}，请稍后再试。")
+
+        job = self.db_worker.submit(export_students, file_path,
+                                    on_done=on_done, on_error=on_error, on_progress=on_progress)
+
+        def cancel():
+            job.cancel()
+            progress_window.destroy()
+
+        tk.Button(progress_window, text="取消", command=cancel,
+                  bg='#E74C3C', fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(pady=5)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
+
+    def _show_audit_page(self):
+        """显示操作日志页面，可按时间范围筛选"""
+        self._clear_content()
+        frame = tk.Frame(self.content_frame, bg=BG_COLOR, padx=30, pady=20)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        # 页面标题
+        tk.Label(frame, text="操作日志", font=('Microsoft YaHei', 18, 'bold'), bg=BG_COLOR).pack(pady=20)
+
+        # 时间范围
+        range_frame = tk.Frame(frame, bg=BG_COLOR)
+        range_frame.pack(fill=tk.X, pady=10)
+        tk.Label(range_frame, text="开始时间:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+        start_entry = tk.Entry(range_frame, font=FONT, bd=1, relief=tk.SOLID, width=20)
+        start_entry.pack(side=tk.LEFT, padx=10)
+        tk.Label(range_frame, text="结束时间:", font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+        end_entry = tk.Entry(range_frame, font=FONT, bd=1, relief=tk.SOLID, width=20)
+        end_entry.pack(side=tk.LEFT, padx=10)
+        tk.Label(range_frame, text="（格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS，留空表示不限）",
+                 font=FONT, bg=BG_COLOR).pack(side=tk.LEFT)
+
+        status_label = tk.Label(frame, text="", font=FONT, bg=BG_COLOR)
+        status_label.pack(anchor=tk.W)
+
+        # 日志表格
+        table_frame = tk.Frame(frame, bg=BG_COLOR)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        columns = ['time', 'username', 'operation']
+        tree = ttk.Treeview(table_frame, show='headings', columns=columns)
+        for col, text, width in (('time', '时间', 180), ('username', '用户', 120), ('operation', '操作', 600)):
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor=tk.W if col == 'operation' else tk.CENTER)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        def load():
+            try:
+                start = parse_audit_time(start_entry.get())
+                end = parse_audit_time(end_entry.get(), end=True)
+            except ValueError as e:
+                messagebox.showerror("错误", f"{str(e)}，请按 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS 格式输入。")
+                return
+
+            def on_done(operations):
+                if not tree.winfo_exists():
+                    return
+                tree.delete(*tree.get_children())
+                for operation in operations:
+                    tree.insert("", tk.END, values=operation)
+                status_label.config(text=f"共 {len(operations)} 条（最多显示最近 {AUDIT_PAGE_SIZE} 条）")
+
+            def on_error(error):
+                messagebox.showerror("错误", f"查询操作日志失败: {str(error)}，请稍后再试。")
+
+            # 先写入缓冲中的事件，后台线程按顺序执行，查询结果包含刚刚发生的操作
+            self.audit.flush()
+            self.db_worker.submit(fetch_operations, start, end, on_done=on_done, on_error=on_error)
+
+        tk.Button(range_frame, text="查询", command=load,
+                  bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+
+        load()
+
+    def _show_diagnostics_page(self):
+        """显示查询诊断页面：各 SQL 语句的执行次数、耗时和返回行数，标出疑似 N+1 的查询"""
+        self._clear_content()
+        frame = tk.Frame(self.content_frame, bg=BG_COLOR, padx=30, pady=20)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        # 页面标题
+        tk.Label(frame, text="查询诊断", font=('Microsoft YaHei', 18, 'bold'), bg=BG_COLOR).pack(pady=20)
+
+        if self.tracer is None:
+            tk.Label(frame, text=f"未开启查询跟踪。设置环境变量 {TRACE_ENV}=1 后重新启动程序即可记录每条 SQL 语句的"
+                                 f"执行次数、耗时和返回行数。",
+                     font=FONT, bg=BG_COLOR, wraplength=800, justify=tk.LEFT).pack(anchor=tk.W)
+            return
+
+        btn_frame = tk.Frame(frame, bg=BG_COLOR)
+        btn_frame.pack(fill=tk.X, pady=10)
+        status_label = tk.Label(frame, text="", font=FONT, bg=BG_COLOR)
+        status_label.pack(anchor=tk.W)
+
+        # 统计表格，按总耗时从高到低排列
+        table_frame = tk.Frame(frame, bg=BG_COLOR)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        columns = [('executions', '执行次数', 80), ('statements', 'SQLite 语句数', 100), ('total_ms', '总耗时(ms)', 100),
+                   ('p95_ms', 'P95(ms)', 90), ('rows', '返回行数', 90), ('n_plus_one', 'N+1', 60), ('sql', '语句', 700)]
+        tree = ttk.Treeview(table_frame, show='headings', columns=[col for col, _, _ in columns])
+        for col, text, width in columns:
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor=tk.W if col == 'sql' else tk.CENTER, stretch=col == 'sql')
+        tree.tag_configure('n_plus_one', background='#FADBD8')
+        y_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        x_scrollbar = ttk.Scrollbar(table_frame, orient=tk.HORIZONTAL, command=tree.xview)
+        tree.configure(yscroll=y_scrollbar.set, xscroll=x_scrollbar.set)
+        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        def refresh():
+            statements = self.tracer.snapshot()
+            tree.delete(*tree.get_children())
+            for item in statements:
+                tree.insert("", tk.END, tags=('n_plus_one',) if item['n_plus_one'] else (), values=(
+                    item['executions'], item['statements'], f"{item['total_ms']:.2f}",
+                    f"{item['p95_ms']:.2f}" if item['p95_ms'] is not None else "-", item['rows'],
+                    "是" if item['n_plus_one'] else "", item['sql']))
+            suspects = sum(item['n_plus_one'] for item in statements)
+            status_label.config(text=f"自 {self.tracer.started:%Y-%m-%d %H:%M:%S} 起共 {len(statements)} 种语句，"
+                                     f"疑似 N+1 查询 {suspects} 种（同一 SELECT 短时间内被逐条执行多次）")
+
+        def reset():
+            self.tracer.reset()
+            refresh()
+
+        def dump():
+            file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON 文件", "*.json")])
+            if not file_path:
+                return
+            try:
+                self.tracer.dump(file_path)
+                messagebox.showinfo("成功", f"查询统计已导出到 {file_path}")
+            except OSError as e:
+                messagebox.showerror("错误", f"导出失败: {str(e)}，请稍后再试。")
+
+        for text, command in (("刷新", refresh), ("清空", reset), ("导出到文件", dump)):
+            tk.Button(btn_frame, text=text, command=command,
+                      bg=BTN_BG_COLOR, fg=BTN_FG_COLOR, font=FONT, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+
+        refresh()
 
     def _clear_content(self):
         """清空内容区域"""
@@ -0,0 +1,1403 @@
+"""学生信息管理系统的数据层：数据库连接、结构迁移、查询、统计、导入导出和维护
+
+不依赖 tkinter，图形界面（main.py）、命令行（cli.py）和基准测试共用。每个函数以连接为第一个参数，
+通过 conn.execute 为每次操作使用独立的游标；写操作在 transaction() 划定的显式事务中执行，
+出错时整体回滚。单条记录以具名元组返回，字段可按名称访问，也可以像普通元组一样解包。
+"""
+import csv
+import itertools
+import sqlite3
+import warnings
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from db_trace import TracedConnection
+
+# 数据库文件
+DB_PATH = 'students_encrypted.db'
+
+# 数据库连接参数配置：default 为 SQLite 默认设置；tuned 使用 WAL 日志、NORMAL 同步、
+# 32MB 页缓存、256MB 内存映射，临时表放在内存中
+DB_PROFILES = {
+    'default': {},
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+DB_PROFILE = 'tuned'
+
+# 每个连接缓存的预编译语句数；查询页的排序方式、筛选条件和排名列组合出的语句较多，高于默认的 128
+STATEMENT_CACHE_SIZE = 256
+
+# 缺考/未录入成绩的显示值，数据库中以 NULL 存储
+MISSING_SCORE = "无"
+
+# 数据库结构版本（记录在 PRAGMA user_version 中）
+SCHEMA_VERSION = 9
+
+# 单个学生总成绩的计算表达式（在 UPDATE students 中按行求值），由触发器维护到 total_score 列
+TOTAL_SCORE_SQL = """
+    COALESCE(chinese, 0) + COALESCE(math, 0) + COALESCE(english, 0)
+    + CASE WHEN (SELECT value FROM settings WHERE key = 'total_includes_custom') = '1'
+           THEN COALESCE((SELECT SUM(CAST(field_value AS REAL)) FROM student_fields
+                          WHERE student_fields.student_id = students.id), 0)
+           ELSE 0 END
+"""
+
+# 查询页排序方式: (排序列, 方向)；缺考成绩为 NULL，排序时视为最低分
+SORT_OPTIONS = {
+    "总成绩从高到低": ("total_score", "DESC"),
+    "总成绩从低到高": ("total_score", "ASC"),
+    "语文成绩从高到低": ("chinese", "DESC"),
+    "语文成绩从低到高": ("chinese", "ASC"),
+    "数学成绩从高到低": ("math", "DESC"),
+    "数学成绩从低到高": ("math", "ASC"),
+    "英语成绩从高到低": ("english", "DESC"),
+    "英语成绩从低到高": ("english", "ASC"),
+}
+
+# 查询表格每次从数据库读取的行数，滚动接近底部时再加载下一页
+QUERY_PAGE_SIZE = 200
+
+# 查询页可按分数范围筛选、统计页可查看成绩趋势的列
+SCORE_COLUMNS = {'chinese': '语文', 'math': '数学', 'english': '英语', 'total_score': '总成绩'}
+
+# 查询页可选显示的排名列（在整场考试内计算，不受搜索条件影响），列名为 “成绩列_类别”
+RANK_KINDS = {'rank': '排名', 'dense_rank': '密集排名', 'percentile': '百分位'}
+
+# 姓名前缀匹配的上界后缀：name >= 前缀 AND name < 前缀 + 最大码位
+NAME_PREFIX_END = '\U0010ffff'
+
+# 按考试筛选、按学生查自定义学科等高频查询，启动时用 EXPLAIN QUERY PLAN 检查是否命中索引
+HOT_QUERIES = [
+    ("""SELECT id, name, chinese, math, english, total_score FROM students WHERE exam_id = ?
+        ORDER BY total_score DESC, id DESC LIMIT ? OFFSET ?""", (0, QUERY_PAGE_SIZE, 0)),
+    ("SELECT COUNT(*) FROM students WHERE exam_id = ?", (0,)),
+    ("""SELECT id, name, chinese, math, english, total_score FROM students
+        WHERE exam_id = ? AND name >= ? AND name < ?
+        ORDER BY total_score DESC, id DESC LIMIT ? OFFSET ?""", (0, '', NAME_PREFIX_END, QUERY_PAGE_SIZE, 0)),
+    ("SELECT id FROM exams WHERE exam_name = ?", ('',)),
+    ("SELECT id FROM subjects WHERE subject_name = ?", ('',)),
+    ("SELECT subject_id, cnt FROM subject_stats WHERE exam_id = ?", (0,)),
+    ("""SELECT operation_time, username, operation_type FROM operations
+        WHERE operation_time >= ? AND operation_time < ?
+        ORDER BY operation_time DESC LIMIT ?""", ('', '', 0)),
+    ("SELECT id FROM pupils WHERE name = ?", ('',)),
+    ("""SELECT exam_id, total_score FROM students
+        WHERE pupil_id = ? ORDER BY exam_id""", (0,)),
+    ("""SELECT DISTINCT student_fields.subject_id FROM student_fields
+        JOIN students ON student_fields.student_id = students.id
+        WHERE students.exam_id = ?""", (0,)),
+    ("""SELECT student_fields.student_id, subjects.subject_name, student_fields.field_value
+        FROM student_fields JOIN subjects ON subjects.id = student_fields.subject_id
+        WHERE student_fields.student_id IN (?, ?)""", (0, 1)),
+]
+
+
+# 固定学科的显示名称
+SUBJECT_LABELS = {'chinese': '语文', 'math': '数学', 'english': '英语'}
+
+# subject_stats 中固定学科的保留学科 id；自定义学科使用 subjects.id（正数），两者不会冲突
+FIXED_SUBJECT_IDS = {'chinese': -1, 'math': -2, 'english': -3}
+
+# 统计页计算的百分位数
+STAT_PERCENTILES = (25, 50, 75, 90)
+
+# 导出时每写入多少名学生回调一次进度
+EXPORT_PROGRESS_INTERVAL = 1000
+
+# 批量导入时表头与固定列的对应关系，其余列作为自定义学科
+IMPORT_COLUMNS = {'姓名': 'name', '语文': 'chinese', '数学': 'math', '英语': 'english'}
+
+# 批量导入时每批 executemany 的学生数
+IMPORT_BATCH_SIZE = 5000
+
+# 操作日志中时间的存储格式（按字符串比较即按时间先后）
+AUDIT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 操作日志页最多显示的条数（最新的在前）
+AUDIT_PAGE_SIZE = 500
+
+# 单条记录的返回类型
+Exam = namedtuple('Exam', 'name student_count')
+StudentInfo = namedtuple('StudentInfo', 'name chinese math english exam_name')
+User = namedtuple('User', 'id username')
+TrendPoint = namedtuple('TrendPoint', 'exam_name score exam_mean matches')
+Pupil = namedtuple('Pupil', 'id name exam_names')
+
+# update_student 的 pupil 参数：为学生新建一个身份（与同名的其他学生区分开）
+NEW_PUPIL = 'new'
+Operation = namedtuple('Operation', 'time username operation')
+
+
+def parse_score(text):
+    """将输入框中的成绩解析为浮点数，空白或“无”返回 None，非数字抛出 ValueError"""
+    text = str(text).strip()
+    if not text or text == MISSING_SCORE:
+        return None
+    return float(text)
+
+
+def format_score(value):
+    """将数据库中的成绩转换为显示值：整数分数不带小数部分（与录入的 90 一致，而不是 90.0），NULL 显示为“无”"""
+    if value is None:
+        return MISSING_SCORE
+    return int(value) if float(value).is_integer() else value
+
+
+class Connection(sqlite3.Connection):
+    """connect_db 返回的连接；与 sqlite3.Connection 相同，但可以附加连接级的状态（如排名快照）"""
+
+    rank_snapshot = None
+
+
+def connect_db(db_path=DB_PATH, profile=DB_PROFILE, tracer=None):
+    """按配置打开数据库连接；提供 tracer（db_trace.QueryTracer）时记录该连接执行的每条语句"""
+    if tracer is None:
+        conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, factory=Connection)
+    else:
+        conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, factory=TracedConnection)
+        tracer.attach(conn)
+    # 须在切换日志模式之前设置，仅对新建的空数据库生效；已有数据库在首次维护时通过 VACUUM 切换
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    for pragma, value in DB_PROFILES[profile].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    # 删除考试时级联删除学生及其自定义学科成绩
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+@contextmanager
+def transaction(conn, mode=''):
+    """显式事务：with 块正常结束时提交，抛出异常时回滚并继续抛出
+
+    mode 为 BEGIN 的事务类型（''、'IMMEDIATE' 或 'EXCLUSIVE'），批量写入时用 IMMEDIATE 提前获取写锁。
+    """
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def init_schema(conn):
+    """创建数据库表，升级旧版本数据库，并创建索引和触发器
+
+    返回升级过程中需要告知用户的说明列表，没有时为空列表。
+    """
+    # 新建的数据库直接使用最新结构，无需迁移
+    if not _table_columns(conn, 'students'):
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS exams (
+        id INTEGER PRIMARY KEY, exam_name TEXT UNIQUE)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS subjects (
+        id INTEGER PRIMARY KEY, subject_name TEXT UNIQUE)''')
+    # 跨考试的学生身份；同名的不同学生可以各有一个身份，因此 name 不唯一
+    conn.execute('''CREATE TABLE IF NOT EXISTS pupils (
+        id INTEGER PRIMARY KEY, name TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY, name TEXT, chinese REAL, math REAL, english REAL,
+        exam_id INTEGER REFERENCES exams(id) ON DELETE CASCADE,
+        total_score REAL,
+        pupil_id INTEGER REFERENCES pupils(id))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS student_fields (
+        id INTEGER PRIMARY KEY,
+        student_id INTEGER REFERENCES students(id) ON DELETE CASCADE,
+        subject_id INTEGER REFERENCES subjects(id),
+        field_value TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS operations (
+        id INTEGER PRIMARY KEY, username TEXT, operation_type TEXT, operation_time DATETIME)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY, value TEXT)''')
+    _create_subject_stats_table(conn)
+    conn.commit()
+    notices = _migrate_schema(conn)
+    _create_indexes(conn)
+    _create_triggers(conn)
+    _check_query_plans(conn)
+    return notices
+
+
+def _create_subject_stats_table(conn):
+    """创建各考试各学科的成绩汇总表（人数、总和、平方和、最低/最高分），由触发器增量维护
+
+    subject_id 为自定义学科的 subjects.id 或固定学科的保留 id（见 FIXED_SUBJECT_IDS），
+    extremes_stale 表示删除过当前的最低/最高分，需重新计算。
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS subject_stats (
+        exam_id INTEGER REFERENCES exams(id) ON DELETE CASCADE,
+        subject_id INTEGER,
+        cnt INTEGER, total REAL, total_sq REAL, min_score REAL, max_score REAL,
+        extremes_stale INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (exam_id, subject_id))''')
+
+
+def _migrate_schema(conn):
+    """按 user_version 依次升级旧版本数据库，返回需要告知用户的升级说明（如删除了无法迁移的数据）"""
+    notices = []
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return notices
+
+    # 迁移过程中需要重建表，重建期间关闭外键检查，避免 DROP TABLE 触发级联删除
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        conn.execute("BEGIN")
+        if version < 1:
+            _migrate_score_columns(conn)
+        if version < 2:
+            _dedupe_student_fields(conn)
+        if version < 3:
+            _add_total_score_column(conn)
+        # 未填写考试名称、无法归属任何考试的学生人数
+        removed = 0
+        if version < 4:
+            removed += _add_cascading_foreign_keys(conn)
+        if version < 5:
+            removed += _normalize_names(conn)
+        if version < 6:
+            _add_pupil_identity(conn)
+        if version < 7:
+            _rebuild_subject_stats(conn)
+        if version < 8:
+            _allow_namesake_pupils(conn)
+        if version < 9:
+            _key_subject_stats_by_id(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        if removed:
+            notices.append(f"删除了 {removed} 名未填写考试名称的学生")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return notices
+
+
+def _table_columns(conn, table):
+    """返回表的 {列名: 类型}"""
+    rows = conn.execute(f"PRAGMA table_info({table})")
+    return {row[1]: row[2].upper() for row in rows}
+
+
+def _migrate_score_columns(conn):
+    """将语文、数学、英语成绩从 TEXT（缺考记为“无”）迁移为 REAL（缺考记为 NULL）"""
+    column_types = _table_columns(conn, 'students')
+    if all(column_types.get(col) == 'REAL' for col in ('chinese', 'math', 'english')):
+        return
+
+    def to_real(col):
+        return f"CASE WHEN TRIM({col}) IN ('', '{MISSING_SCORE}') THEN NULL ELSE CAST({col} AS REAL) END"
+
+    conn.execute('''CREATE TABLE students_new (
+        id INTEGER PRIMARY KEY, name TEXT, chinese REAL, math REAL, english REAL, exam_name TEXT)''')
+    conn.execute(f"""
+        INSERT INTO students_new (id, name, chinese, math, english, exam_name)
+        SELECT id, name, {to_real('chinese')}, {to_real('math')}, {to_real('english')}, exam_name
+        FROM students
+    """)
+    conn.execute("DROP TABLE students")
+    conn.execute("ALTER TABLE students_new RENAME TO students")
+
+
+def _dedupe_student_fields(conn):
+    """删除同一学生重复的自定义学科（保留最后录入的一条），为唯一索引做准备"""
+    conn.execute("""
+        DELETE FROM student_fields
+        WHERE id NOT IN (SELECT MAX(id) FROM student_fields GROUP BY student_id, field_name)
+    """)
+
+
+def _add_total_score_column(conn):
+    """新增物化的总成绩列并回填，原 exam_name 单列索引由 (exam_name, total_score) 复合索引取代"""
+    if 'total_score' not in _table_columns(conn, 'students'):
+        conn.execute("ALTER TABLE students ADD COLUMN total_score REAL")
+    conn.execute("DROP INDEX IF EXISTS idx_students_exam")
+    conn.execute(f"UPDATE students SET total_score = {TOTAL_SCORE_SQL}")
+
+
+def _has_cascading_foreign_key(conn, table):
+    """表是否已声明 ON DELETE CASCADE 外键"""
+    return any(row[6].upper() == 'CASCADE' for row in conn.execute(f"PRAGMA foreign_key_list({table})"))
+
+
+def _register_student_exams(conn):
+    """把学生记录中出现、但 exams 中没有的考试名称补录为考试，返回删除的学生人数
+
+    旧版本录入和修改学生时可以直接输入考试名称而不创建考试，这些学生仍是有效数据（导出时包含），
+    不能当作孤立数据删除。只删除考试名称为空、无法归属任何考试的学生（连同其自定义学科成绩）。
+    """
+    conn.execute("""
+        INSERT OR IGNORE INTO exams (exam_name)
+        SELECT exam_name FROM students
+        WHERE exam_name IS NOT NULL
+        GROUP BY exam_name
+        ORDER BY MIN(id)
+    """)
+    removed = conn.execute("DELETE FROM students WHERE exam_name IS NULL").rowcount
+    conn.execute("DELETE FROM student_fields WHERE student_id NOT IN (SELECT id FROM students)")
+    return removed
+
+
+def _add_cascading_foreign_keys(conn):
+    """补录学生所属的考试、清理孤立数据，并重建 students/student_fields 以声明级联删除的外键
+
+    返回删除的（未填写考试名称的）学生人数。
+    """
+    removed = _register_student_exams(conn)
+
+    if not _has_cascading_foreign_key(conn, 'students'):
+        conn.execute('''CREATE TABLE students_new (
+            id INTEGER PRIMARY KEY, name TEXT, chinese REAL, math REAL, english REAL,
+            exam_name TEXT REFERENCES exams(exam_name) ON DELETE CASCADE ON UPDATE CASCADE,
+            total_score REAL)''')
+        conn.execute("""
+            INSERT INTO students_new (id, name, chinese, math, english, exam_name, total_score)
+            SELECT id, name, chinese, math, english, exam_name, total_score FROM students
+        """)
+        conn.execute("DROP TABLE students")
+        conn.execute("ALTER TABLE students_new RENAME TO students")
+
+    if not _has_cascading_foreign_key(conn, 'student_fields'):
+        conn.execute('''CREATE TABLE student_fields_new (
+            id INTEGER PRIMARY KEY, student_id INTEGER, field_name TEXT, field_value TEXT,
+            FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE)''')
+        conn.execute("""
+            INSERT INTO student_fields_new (id, student_id, field_name, field_value)
+            SELECT id, student_id, field_name, field_value FROM student_fields
+        """)
+        conn.execute("DROP TABLE student_fields")
+        conn.execute("ALTER TABLE student_fields_new RENAME TO student_fields")
+    return removed
+
+
+def _normalize_names(conn):
+    """将学生的考试名称和自定义学科名称替换为 exams/subjects 表的整数 id
+
+    重建 students（exam_name → exam_id）和 student_fields（field_name → subject_id），
+    学科按首次出现的顺序编号。exams 中没有的考试名称先补录，返回删除的（未填写考试名称的）学生人数。
+    """
+    # 触发器引用了被重建的表，先删除，迁移完成后由 _create_triggers 重新创建
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    for (trigger,) in triggers:
+        conn.execute(f"DROP TRIGGER {trigger}")
+
+    removed = _register_student_exams(conn)
+    conn.execute("""
+        INSERT OR IGNORE INTO subjects (subject_name)
+        SELECT field_name FROM student_fields
+        WHERE field_name IS NOT NULL
+        GROUP BY field_name
+        ORDER BY MIN(id)
+    """)
+
+    conn.execute('''CREATE TABLE students_new (
+        id INTEGER PRIMARY KEY, name TEXT, chinese REAL, math REAL, english REAL,
+        exam_id INTEGER REFERENCES exams(id) ON DELETE CASCADE,
+        total_score REAL)''')
+    conn.execute("""
+        INSERT INTO students_new (id, name, chinese, math, english, exam_id, total_score)
+        SELECT students.id, students.name, students.chinese, students.math, students.english,
+               exams.id, students.total_score
+        FROM students JOIN exams ON exams.exam_name = students.exam_name
+    """)
+    conn.execute("DROP TABLE students")
+    conn.execute("ALTER TABLE students_new RENAME TO students")
+
+    conn.execute('''CREATE TABLE student_fields_new (
+        id INTEGER PRIMARY KEY,
+        student_id INTEGER REFERENCES students(id) ON DELETE CASCADE,
+        subject_id INTEGER REFERENCES subjects(id),
+        field_value TEXT)''')
+    conn.execute("""
+        INSERT INTO student_fields_new (id, student_id, subject_id, field_value)
+        SELECT student_fields.id, student_fields.student_id, subjects.id, student_fields.field_value
+        FROM student_fields JOIN subjects ON subjects.subject_name = student_fields.field_name
+    """)
+    conn.execute("DROP TABLE student_fields")
+    conn.execute("ALTER TABLE student_fields_new RENAME TO student_fields")
+    return removed
+
+
+def _add_pupil_identity(conn):
+    """新增跨考试的学生身份：同名的学生记录关联到同一个 pupils 行"""
+    conn.execute("ALTER TABLE students ADD COLUMN pupil_id INTEGER REFERENCES pupils(id)")
+    conn.execute("""
+        INSERT OR IGNORE INTO pupils (name)
+        SELECT name FROM students GROUP BY name ORDER BY MIN(id)
+    """)
+    conn.execute("UPDATE students SET pupil_id = (SELECT id FROM pupils WHERE pupils.name = students.name)")
+
+
+def _allow_namesake_pupils(conn):
+    """去掉 pupils.name 的唯一约束，使同名的不同学生可以有各自的身份，同时删除不再被引用的身份"""
+    # 关联身份的触发器引用了被重建的表，先删除，迁移完成后由 _create_triggers 按新的规则重新创建
+    conn.execute("DROP TRIGGER IF EXISTS trg_students_pupil_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_students_pupil_update")
+    conn.execute('''CREATE TABLE pupils_new (
+        id INTEGER PRIMARY KEY, name TEXT)''')
+    conn.execute("""
+        INSERT INTO pupils_new (id, name)
+        SELECT id, name FROM pupils WHERE id IN (SELECT pupil_id FROM students)
+    """)
+    conn.execute("DROP TABLE pupils")
+    conn.execute("ALTER TABLE pupils_new RENAME TO pupils")
+
+
+def _key_subject_stats_by_id(conn):
+    """subject_stats 改为以学科 id 而不是学科名称区分学科，避免自定义学科与固定学科列名同名时混在一起"""
+    # 维护汇总的触发器引用了旧的 subject 列，先删除，迁移完成后由 _create_triggers 重新创建
+    for trigger in ('trg_students_stats_insert', 'trg_students_stats_update', 'trg_students_stats_move',
+                    'trg_students_stats_delete', 'trg_student_fields_stats_insert',
+                    'trg_student_fields_stats_update', 'trg_student_fields_stats_delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE subject_stats")
+    _create_subject_stats_table(conn)
+    _rebuild_subject_stats(conn)
+
+
+def _delete_orphans(conn):
+    """删除不属于任何考试的学生、不属于任何学生的自定义学科成绩和没有学生记录的身份，返回 (学生数, 成绩数)"""
+    students = conn.execute("""
+        DELETE FROM students
+        WHERE exam_id IS NULL OR exam_id NOT IN (SELECT id FROM exams)
+    """).rowcount
+    fields = conn.execute("""
+        DELETE FROM student_fields WHERE student_id NOT IN (SELECT id FROM students)
+    """).rowcount
+    conn.execute("""
+        DELETE FROM pupils WHERE id NOT IN (SELECT pupil_id FROM students WHERE pupil_id IS NOT NULL)
+    """)
+    return students, fields
+
+
+def _create_indexes(conn):
+    """创建二级索引"""
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_students_exam_total
+        ON students(exam_id, total_score)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_students_exam_name
+        ON students(exam_id, name)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_students_pupil_exam
+        ON students(pupil_id, exam_id)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_pupils_name
+        ON pupils(name)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_operations_time
+        ON operations(operation_time)""")
+    conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_student_fields_student_subject
+        ON student_fields(student_id, subject_id)""")
+    conn.commit()
+
+
+def _create_triggers(conn):
+    """创建维护 total_score 和 pupil_id 的触发器，任何写入路径都会自动更新总成绩和学生身份"""
+    refresh = f"UPDATE students SET total_score = {TOTAL_SCORE_SQL} WHERE id = {{}};"
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_total_insert
+        AFTER INSERT ON students BEGIN {refresh.format('NEW.id')} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_total_update
+        AFTER UPDATE OF chinese, math, english ON students BEGIN {refresh.format('NEW.id')} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_student_fields_total_insert
+        AFTER INSERT ON student_fields BEGIN {refresh.format('NEW.student_id')} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_student_fields_total_update
+        AFTER UPDATE ON student_fields BEGIN
+            {refresh.format('OLD.student_id')} {refresh.format('NEW.student_id')} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_student_fields_total_delete
+        AFTER DELETE ON student_fields BEGIN {refresh.format('OLD.student_id')} END""")
+
+    # 未指定身份的学生按姓名关联到最早的同名身份，没有同名身份时新建；
+    # 改名时同样按新姓名重新关联，除非同一条语句中显式修改了 pupil_id
+    link_pupil = """
+        INSERT INTO pupils (name) SELECT NEW.name WHERE NOT EXISTS (SELECT 1 FROM pupils WHERE name = NEW.name);
+        UPDATE students SET pupil_id = (SELECT MIN(id) FROM pupils WHERE name = NEW.name) WHERE id = NEW.id;"""
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_pupil_insert
+        AFTER INSERT ON students WHEN NEW.pupil_id IS NULL BEGIN {link_pupil} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_pupil_update
+        AFTER UPDATE OF name ON students WHEN OLD.name IS NOT NEW.name AND NEW.pupil_id IS OLD.pupil_id
+        BEGIN {link_pupil} END""")
+
+    # subject_stats：成绩写入时计入，删除或修改时扣除旧值
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_stats_insert
+        AFTER INSERT ON students BEGIN {_stats_add_sql(_fixed_scores_sql('NEW'))} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_stats_update
+        AFTER UPDATE OF chinese, math, english, exam_id ON students
+        WHEN OLD.chinese IS NOT NEW.chinese OR OLD.math IS NOT NEW.math OR OLD.english IS NOT NEW.english
+             OR OLD.exam_id IS NOT NEW.exam_id
+        BEGIN {_stats_remove_sql(_fixed_scores_sql('OLD'), 'OLD.exam_id')}
+              {_stats_add_sql(_fixed_scores_sql('NEW'))} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_stats_move
+        AFTER UPDATE OF exam_id ON students WHEN OLD.exam_id IS NOT NEW.exam_id
+        BEGIN {_stats_remove_sql(_student_custom_scores_sql('OLD.id', 'OLD.exam_id'), 'OLD.exam_id')}
+              {_stats_add_sql(_student_custom_scores_sql('NEW.id', 'NEW.exam_id'))} END""")
+    # 级联删除自定义学科成绩时学生已被删除，触发器无法再查到考试，因此在删除学生之前一并扣除；
+    # 删除考试时考试先被删除、其汇总行随之级联删除，无需逐个学生扣除
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_students_stats_delete
+        BEFORE DELETE ON students WHEN EXISTS (SELECT 1 FROM exams WHERE id = OLD.exam_id)
+        BEGIN {_stats_remove_sql(_fixed_scores_sql('OLD'), 'OLD.exam_id')}
+              {_stats_remove_sql(_student_custom_scores_sql('OLD.id', 'OLD.exam_id'), 'OLD.exam_id')} END""")
+    field_exam = "(SELECT exam_id FROM students WHERE id = {}.student_id)"
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_student_fields_stats_insert
+        AFTER INSERT ON student_fields BEGIN {_stats_add_sql(_field_score_sql('NEW'))} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_student_fields_stats_update
+        AFTER UPDATE ON student_fields
+        BEGIN {_stats_remove_sql(_field_score_sql('OLD'), field_exam.format('OLD'))}
+              {_stats_add_sql(_field_score_sql('NEW'))} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_student_fields_stats_delete
+        AFTER DELETE ON student_fields WHEN EXISTS (SELECT 1 FROM students WHERE id = OLD.student_id)
+        BEGIN {_stats_remove_sql(_field_score_sql('OLD'), field_exam.format('OLD'))} END""")
+    conn.commit()
+
+
+def _custom_score_sql(column):
+    """把自定义学科成绩（文本）转换为数值的表达式，空白和缺考为 NULL"""
+    return f"CASE WHEN TRIM({column}) NOT IN ('', '{MISSING_SCORE}') THEN CAST({column} AS REAL) END"
+
+
+def _fixed_scores_sql(row):
+    """触发器中 row（NEW/OLD）这名学生的固定学科成绩：(exam_id, subject_id, score) 行"""
+    return " UNION ALL ".join(
+        f"SELECT {row}.exam_id AS exam_id, {subject_id} AS subject_id, {row}.{column} AS score"
+        for column, subject_id in FIXED_SUBJECT_IDS.items())
+
+
+def _student_custom_scores_sql(student_id, exam_id):
+    """一名学生的全部自定义学科成绩，计入 exam_id 考试：(exam_id, subject_id, score) 行"""
+    return f"""SELECT {exam_id} AS exam_id, student_fields.subject_id AS subject_id,
+                      {_custom_score_sql('student_fields.field_value')} AS score
+               FROM student_fields
+               WHERE student_fields.student_id = {student_id}"""
+
+
+def _field_score_sql(row):
+    """触发器中 row（NEW/OLD）这条自定义学科成绩：(exam_id, subject_id, score) 行，所属学生不存在时没有行"""
+    return f"""SELECT students.exam_id AS exam_id, {row}.subject_id AS subject_id,
+                      {_custom_score_sql(f'{row}.field_value')} AS score
+               FROM students
+               WHERE students.id = {row}.student_id"""
+
+
+def _stats_add_sql(scores):
+    """把 scores 查询得到的 (exam_id, subject_id, score) 成绩计入 subject_stats 的语句"""
+    return f"""
+        INSERT INTO subject_stats (exam_id, subject_id, cnt, total, total_sq, min_score, max_score)
+        SELECT exam_id, subject_id, COUNT(*), SUM(score), SUM(score * score), MIN(score), MAX(score)
+        FROM ({scores}) WHERE score IS NOT NULL AND exam_id IS NOT NULL
+        GROUP BY exam_id, subject_id
+        ON CONFLICT (exam_id, subject_id) DO UPDATE SET
+            cnt = cnt + excluded.cnt, total = total + excluded.total, total_sq = total_sq + excluded.total_sq,
+            min_score = MIN(min_score, excluded.min_score), max_score = MAX(max_score, excluded.max_score);"""
+
+
+def _stats_remove_sql(scores, exam_id):
+    """从 subject_stats 中扣除 scores 查询得到的成绩的语句
+
+    扣除的成绩等于当前最低/最高分时无法得知新的最值，只标记 extremes_stale，读取时再重新计算；
+    人数减到 0 的汇总行删除。
+    """
+    return f"""
+        UPDATE subject_stats SET
+            cnt = cnt - removed.n, total = total - removed.s, total_sq = total_sq - removed.sq,
+            extremes_stale = extremes_stale OR removed.lo <= min_score OR removed.hi >= max_score
+        FROM (SELECT exam_id, subject_id, COUNT(*) AS n, SUM(score) AS s, SUM(score * score) AS sq,
+                     MIN(score) AS lo, MAX(score) AS hi
+              FROM ({scores}) WHERE score IS NOT NULL
+              GROUP BY exam_id, subject_id) AS removed
+        WHERE subject_stats.exam_id = removed.exam_id AND subject_stats.subject_id = removed.subject_id;
+        DELETE FROM subject_stats WHERE exam_id = {exam_id} AND cnt <= 0;"""
+
+
+def _subject_scores_sql(exam_filter=""):
+    """各考试各学科的有效成绩（缺考不计）：(exam_id, subject_id, score) 行，exam_filter 为追加的 students 条件"""
+    fixed = [f"SELECT students.exam_id AS exam_id, {subject_id} AS subject_id, students.{column} AS score "
+             f"FROM students WHERE students.{column} IS NOT NULL{exam_filter}"
+             for column, subject_id in FIXED_SUBJECT_IDS.items()]
+    custom = f"""SELECT students.exam_id, student_fields.subject_id, CAST(student_fields.field_value AS REAL)
+                 FROM student_fields
+                 JOIN students ON student_fields.student_id = students.id
+                 WHERE TRIM(student_fields.field_value) NOT IN ('', '{MISSING_SCORE}'){exam_filter}"""
+    return "\nUNION ALL\n".join([*fixed, custom])
+
+
+def _rebuild_subject_stats(conn):
+    """从学生成绩重新计算全部 subject_stats（需在调用方的事务中执行）"""
+    conn.execute("DELETE FROM subject_stats")
+    conn.execute(f"""
+        INSERT INTO subject_stats (exam_id, subject_id, cnt, total, total_sq, min_score, max_score)
+        SELECT exam_id, subject_id, COUNT(*), SUM(score), SUM(score * score), MIN(score), MAX(score)
+        FROM ({_subject_scores_sql()})
+        WHERE exam_id IN (SELECT id FROM exams)
+        GROUP BY exam_id, subject_id
+    """)
+
+
+def rebuild_subject_stats(conn):
+    """在一个事务中重新计算全部考试的学科汇总，消除增量维护中累积的浮点误差"""
+    with transaction(conn):
+        _rebuild_subject_stats(conn)
+
+
+def _check_query_plans(conn):
+    """检查高频查询的执行计划，出现全表扫描时给出警告
+
+    只在尚无 ANALYZE 统计信息时检查：有统计信息后，优化器可能对很小的表合理地选择全表扫描。
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        return
+    for sql, params in HOT_QUERIES:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[-1]
+            if detail.startswith("SCAN") and "USING" not in detail:
+                warnings.warn(f"查询未使用索引: {detail}\n{sql}", RuntimeWarning)
+
+
+def purge_orphans(conn):
+    """在一个事务中清理孤立的学生和自定义学科成绩，返回 (学生数, 成绩数)"""
+    with transaction(conn):
+        return _delete_orphans(conn)
+
+
+def compact_db(conn):
+    """回收数据库空闲页，返回回收的页数
+
+    auto_vacuum 尚未切换为 INCREMENTAL 的旧数据库需完整 VACUUM 一次，之后只做增量回收。
+    """
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # incremental_vacuum 每步只回收一页，executescript 会一直执行到结束
+        conn.executescript("PRAGMA incremental_vacuum;")
+    return free_pages
+
+
+def run_maintenance(conn):
+    """数据库维护：清理孤立数据、重建学科汇总、回收空闲页并更新查询优化器统计信息"""
+    orphan_students, orphan_fields = purge_orphans(conn)
+    rebuild_subject_stats(conn)
+    free_pages = compact_db(conn)
+    conn.execute("PRAGMA optimize")
+    return {'orphan_students': orphan_students, 'orphan_fields': orphan_fields, 'free_pages': free_pages}
+
+
+def fetch_total_includes_custom(conn):
+    """总成绩是否计入自定义学科"""
+    row = conn.execute("SELECT value FROM settings WHERE key = 'total_includes_custom'").fetchone()
+    return bool(row) and row[0] == '1'
+
+
+def set_total_includes_custom(conn, include_custom):
+    """在一个事务中切换总成绩是否计入自定义学科，并重新计算所有学生的总成绩"""
+    with transaction(conn):
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('total_includes_custom', ?)",
+                     ('1' if include_custom else '0',))
+        conn.execute(f"UPDATE students SET total_score = {TOTAL_SCORE_SQL}")
+
+
+def ensure_exam(conn, exam_name):
+    """返回考试的 id，考试不存在时自动创建（需在调用方的事务中执行）"""
+    conn.execute("INSERT OR IGNORE INTO exams (exam_name) VALUES (?)", (exam_name,))
+    return conn.execute("SELECT id FROM exams WHERE exam_name = ?", (exam_name,)).fetchone()[0]
+
+
+def ensure_subjects(conn, subject_names):
+    """返回 {学科名称: 学科 id}，学科不存在时自动创建（需在调用方的事务中执行）"""
+    subject_ids = {}
+    for subject_name in subject_names:
+        if subject_name not in subject_ids:
+            conn.execute("INSERT OR IGNORE INTO subjects (subject_name) VALUES (?)", (subject_name,))
+            subject_ids[subject_name] = conn.execute("SELECT id FROM subjects WHERE subject_name = ?",
+                                                     (subject_name,)).fetchone()[0]
+    return subject_ids
+
+
+def add_student(conn, name, chinese, math, english, exam_name, custom_scores):
+    """在一个事务中添加学生及其自定义学科成绩，返回学生 id；失败时回滚并抛出 sqlite3.Error"""
+    with transaction(conn):
+        # 考试不存在时自动创建（学生通过 exam_id 外键引用 exams）
+        exam_id = ensure_exam(conn, exam_name)
+
+        # 添加新学生
+        cursor = conn.execute("INSERT INTO students (name, chinese, math, english, exam_id) VALUES (?, ?, ?, ?, ?)",
+                              (name, chinese, math, english, exam_id))
+        student_id = cursor.lastrowid
+
+        # 添加自定义字段
+        custom_scores = {field_name.strip(): field_value.strip()
+                         for field_name, field_value in custom_scores.items() if field_name.strip()}
+        subject_ids = ensure_subjects(conn, custom_scores)
+        conn.executemany("INSERT INTO student_fields (student_id, subject_id, field_value) VALUES (?, ?, ?)",
+                         [(student_id, subject_ids[field_name], field_value)
+                          for field_name, field_value in custom_scores.items()])
+    return student_id
+
+
+def update_student(conn, student_id, student=None, removed_fields=(), changed_scores=None, pupil=None):
+    """在一个事务中修改学生，只写入有变化的部分
+
+    student 为新的 StudentInfo（目标考试不存在时自动创建），None 表示基本信息不变；
+    removed_fields 为要删除的自定义学科，changed_scores 为新增或修改的 {自定义学科: 成绩}。
+    pupil 指定学生身份：None 表示不指定（改名时按新姓名关联），身份 id 表示与该身份为同一人，
+    NEW_PUPIL 表示新建身份（与同名的其他学生区分开）。原身份不再有学生记录时删除。
+    """
+    changed_scores = changed_scores or {}
+    with transaction(conn):
+        old_pupil = fetch_student_pupil(conn, student_id)
+        if student is not None:
+            conn.execute("""
+                UPDATE students
+                SET name=?, chinese=?, math=?, english=?, exam_id=?
+                WHERE id=?
+            """, (student.name, student.chinese, student.math, student.english,
+                  ensure_exam(conn, student.exam_name), student_id))
+        # 改名时触发器已按新姓名关联（可能新建了身份），显式指定的身份覆盖它
+        linked_pupil = fetch_student_pupil(conn, student_id)
+        if pupil == NEW_PUPIL:
+            name = conn.execute("SELECT name FROM students WHERE id=?", (student_id,)).fetchone()[0]
+            pupil = conn.execute("INSERT INTO pupils (name) VALUES (?)", (name,)).lastrowid
+        if pupil is not None:
+            conn.execute("UPDATE students SET pupil_id=? WHERE id=?", (pupil, student_id))
+        _delete_unused_pupils(conn, (old_pupil, linked_pupil))
+
+        subject_ids = ensure_subjects(conn, [*removed_fields, *changed_scores])
+
+        # 删除被移除的自定义学科成绩
+        conn.executemany("DELETE FROM student_fields WHERE student_id=? AND subject_id=?",
+                         [(student_id, subject_ids[field]) for field in removed_fields])
+
+        # 新增或修改自定义学科成绩
+        conn.executemany("""
+            INSERT INTO student_fields (student_id, subject_id, field_value) VALUES (?, ?, ?)
+            ON CONFLICT (student_id, subject_id) DO UPDATE SET field_value = excluded.field_value
+        """, [(student_id, subject_ids[field], value) for field, value in changed_scores.items()])
+
+
+def delete_student(conn, student_id):
+    """在一个事务中删除学生，外键级联删除其自定义学科成绩；其身份不再有学生记录时一并删除"""
+    with transaction(conn):
+        pupil_id = fetch_student_pupil(conn, student_id)
+        conn.execute("DELETE FROM students WHERE id=?", (student_id,))
+        _delete_unused_pupils(conn, (pupil_id,))
+
+
+def _delete_unused_pupils(conn, pupil_ids):
+    """删除其中不再被任何学生记录引用的身份（需在调用方的事务中执行）"""
+    conn.executemany("DELETE FROM pupils WHERE id = ? AND NOT EXISTS (SELECT 1 FROM students WHERE pupil_id = ?)",
+                     ((pupil_id, pupil_id) for pupil_id in pupil_ids))
+
+
+def create_exam(conn, exam_name):
+    """创建考试并返回 id，考试已存在时抛出 sqlite3.IntegrityError"""
+    with transaction(conn):
+        return conn.execute("INSERT INTO exams (exam_name) VALUES (?)", (exam_name,)).lastrowid
+
+
+def delete_exam(conn, exam_name):
+    """在一个事务中删除考试，外键级联删除该考试的学生及其自定义学科成绩，返回删除的学生人数
+
+    只出现在这场考试中的学生身份一并删除，与 delete_student 一致。
+    """
+    with transaction(conn):
+        exam_id = fetch_exam_id(conn, exam_name)
+        pupil_ids = [row[0] for row in conn.execute(
+            "SELECT DISTINCT pupil_id FROM students WHERE exam_id = ?", (exam_id,))]
+        students = conn.execute("SELECT COUNT(*) FROM students WHERE exam_id = ?", (exam_id,)).fetchone()[0]
+        conn.execute("DELETE FROM exams WHERE id = ?", (exam_id,))
+        _delete_unused_pupils(conn, pupil_ids)
+    return students
+
+
+def fetch_exams(conn):
+    """按创建顺序逐个返回所有考试及其学生人数（Exam）"""
+    rows = conn.execute("""
+        SELECT exam_name, (SELECT COUNT(*) FROM students WHERE students.exam_id = exams.id)
+        FROM exams
+        ORDER BY id
+    """)
+    return map(Exam._make, rows)
+
+
+def fetch_exam_names(conn):
+    """按创建顺序返回所有考试名称"""
+    return [row[0] for row in conn.execute("SELECT exam_name FROM exams ORDER BY id")]
+
+
+def fetch_exam_id(conn, exam_name):
+    """查询考试的 id，考试不存在时返回 None"""
+    row = conn.execute("SELECT id FROM exams WHERE exam_name = ?", (exam_name,)).fetchone()
+    return row[0] if row else None
+
+
+def fetch_exam_custom_fields(conn, exam_name):
+    """查询考试下出现过的所有自定义学科（按学科创建顺序）"""
+    rows = conn.execute("""
+        SELECT subject_name
+        FROM subjects
+        WHERE id IN (
+            SELECT student_fields.subject_id
+            FROM student_fields
+            JOIN students ON student_fields.student_id = students.id
+            WHERE students.exam_id = ?
+        )
+        ORDER BY id
+    """, (fetch_exam_id(conn, exam_name),))
+    return [row[0] for row in rows]
+
+
+def _student_filter_sql(filters):
+    """将查询页的筛选条件转换为追加到 WHERE 之后的 SQL 片段和参数
+
+    filters 为 None 或 (姓名前缀, ((列, 下限, 上限), ...))，下限/上限为 None 表示不限。
+    姓名前缀写成范围条件，可以走 (exam_id, name) 索引。
+    """
+    if not filters:
+        return "", []
+    name_prefix, ranges = filters
+    clauses, params = [], []
+    if name_prefix:
+        clauses.append("students.name >= ? AND students.name < ?")
+        params += [name_prefix, name_prefix + NAME_PREFIX_END]
+    for column, low, high in ranges:
+        if column not in SCORE_COLUMNS:
+            raise ValueError(f"不支持按 {column} 筛选")
+        if low is not None:
+            clauses.append(f"students.{column} >= ?")
+            params.append(low)
+        if high is not None:
+            clauses.append(f"students.{column} <= ?")
+            params.append(high)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def count_exam_students(conn, exam_name, filters=None):
+    """统计考试中符合筛选条件的学生人数"""
+    filter_sql, filter_params = _student_filter_sql(filters)
+    return conn.execute(f"SELECT COUNT(*) FROM students WHERE students.exam_id = ?{filter_sql}",
+                        [fetch_exam_id(conn, exam_name), *filter_params]).fetchone()[0]
+
+
+def _rank_sql():
+    """生成按成绩列计算排名、密集排名和百分位的窗口函数列及 WINDOW 子句
+
+    排名按分数从高到低，缺考（NULL）的学生单独分区、不参与排名；
+    百分位为 1 - PERCENT_RANK，即第一名为 1，其余按高于该学生的人数占比递减。
+    每列只用一个窗口，三个函数共用一次排序。
+    """
+    columns, windows = [], []
+    for column in SCORE_COLUMNS:
+        not_missing = f"CASE WHEN {column} IS NULL THEN NULL ELSE"
+        columns += [f"{not_missing} RANK() OVER {column}_desc END AS {column}_rank",
+                    f"{not_missing} DENSE_RANK() OVER {column}_desc END AS {column}_dense_rank",
+                    f"{not_missing} 1 - PERCENT_RANK() OVER {column}_desc END AS {column}_percentile"]
+        windows.append(f"{column}_desc AS (PARTITION BY {column} IS NULL ORDER BY {column} DESC)")
+    return ",\n".join(columns), ",\n".join(windows)
+
+
+def _rank_column_names():
+    """排名列的列名，顺序同 _rank_sql"""
+    return [f"{column}_{kind}" for column in SCORE_COLUMNS for kind in RANK_KINDS]
+
+
+def _ensure_exam_ranks(conn, exam_id):
+    """把考试的排名物化到本连接的临时表 temp.exam_ranks，分页时按 student_id 读取，不必每页重算窗口函数
+
+    只保留一场考试的排名。连接上记录快照 (考试 id, data_version, total_changes)：
+    data_version 在其他连接提交后变化，total_changes 在本连接写入后变化，两者之一变化（包括切换总成绩是否
+    计入自定义学科）或换了考试时才重新计算。
+    """
+    snapshot = (exam_id, conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+    if getattr(conn, 'rank_snapshot', None) == snapshot:
+        return
+    rank_columns, rank_windows = _rank_sql()
+    conn.execute(f"""CREATE TEMP TABLE IF NOT EXISTS exam_ranks (
+        student_id INTEGER PRIMARY KEY, {', '.join(_rank_column_names())})""")
+    with transaction(conn):
+        conn.execute("DELETE FROM temp.exam_ranks")
+        conn.execute(f"""
+            INSERT INTO temp.exam_ranks
+            SELECT id, {rank_columns}
+            FROM students
+            WHERE exam_id = ?
+            WINDOW {rank_windows}
+        """, (exam_id,))
+    # 临时表的写入也计入 total_changes，快照取写入之后的值；不是 connect_db 打开的连接无法记录，每次重算
+    try:
+        conn.rank_snapshot = snapshot[:2] + (conn.total_changes,)
+    except AttributeError:
+        pass
+
+
+def fetch_student_page(conn, exam_name, sort_option, offset, limit=QUERY_PAGE_SIZE, filters=None,
+                       with_ranks=False):
+    """按排序方式读取考试中符合筛选条件的一页学生
+
+    返回 [((id, 姓名, 语文, 数学, 英语, 总成绩[, 排名列...]), {自定义学科: 成绩}), ...]。
+    with_ranks 为真时追加各成绩列的排名、密集排名和百分位（顺序同 SCORE_COLUMNS × RANK_KINDS），
+    排名在整场考试内计算，由 _ensure_exam_ranks 物化后各页共用。
+    以 id 作为并列时的次序，保证分页结果稳定；总成绩排序走 (exam_id, total_score) 索引。
+    """
+    sort_column, direction = SORT_OPTIONS.get(sort_option, ("id", "ASC"))
+    filter_sql, filter_params = _student_filter_sql(filters)
+    exam_id = fetch_exam_id(conn, exam_name)
+    if with_ranks:
+        _ensure_exam_ranks(conn, exam_id)
+        # CROSS JOIN 固定以 students 为外层，按排序索引取出一页后再逐行按主键读取排名
+        rank_columns = ", ".join(f"exam_ranks.{column}" for column in _rank_column_names())
+        students = conn.execute(f"""
+            SELECT students.id, students.name, students.chinese, students.math, students.english,
+                   students.total_score, {rank_columns}
+            FROM students CROSS JOIN temp.exam_ranks AS exam_ranks
+            WHERE exam_ranks.student_id = students.id AND students.exam_id = ?{filter_sql}
+            ORDER BY students.{sort_column} {direction}, students.id {direction}
+            LIMIT ? OFFSET ?
+        """, [exam_id, *filter_params, limit, offset]).fetchall()
+    else:
+        students = conn.execute(f"""
+            SELECT students.id, students.name, students.chinese, students.math, students.english,
+                   students.total_score
+            FROM students
+            WHERE students.exam_id = ?{filter_sql}
+            ORDER BY {sort_column} {direction}, id {direction}
+            LIMIT ? OFFSET ?
+        """, [exam_id, *filter_params, limit, offset]).fetchall()
+
+    scores_by_student = fetch_custom_scores(conn, [student[0] for student in students])
+    return [(student, scores_by_student.get(student[0], {})) for student in students]
+
+
+def fetch_student(conn, student_id):
+    """读取单个学生，返回与 fetch_student_page 中单项相同的结构，学生不存在时返回 None"""
+    student = conn.execute("""
+        SELECT id, name, chinese, math, english, total_score FROM students WHERE id = ?
+    """, (student_id,)).fetchone()
+    if student is None:
+        return None
+    return student, fetch_custom_scores(conn, [student[0]]).get(student[0], {})
+
+
+def fetch_student_info(conn, student_id):
+    """读取学生的姓名、固定学科成绩和所属考试（StudentInfo），学生不存在时返回 None"""
+    row = conn.execute("""
+        SELECT students.name, students.chinese, students.math, students.english, exams.exam_name
+        FROM students JOIN exams ON exams.id = students.exam_id
+        WHERE students.id=?
+    """, (student_id,)).fetchone()
+    return StudentInfo._make(row) if row else None
+
+
+def fetch_student_pupil(conn, student_id):
+    """查询学生记录关联的身份 id，学生不存在时返回 None"""
+    row = conn.execute("SELECT pupil_id FROM students WHERE id=?", (student_id,)).fetchone()
+    return row[0] if row else None
+
+
+def fetch_pupils(conn, name):
+    """按创建顺序返回姓名为 name 的所有身份（Pupil），exam_names 为其参加过的考试（按考试创建顺序，以顿号分隔）"""
+    rows = conn.execute("""
+        SELECT pupils.id, pupils.name,
+               (SELECT GROUP_CONCAT(exam_name, '、') FROM (
+                    SELECT exams.exam_name FROM students JOIN exams ON exams.id = students.exam_id
+                    WHERE students.pupil_id = pupils.id GROUP BY exams.id ORDER BY exams.id))
+        FROM pupils
+        WHERE pupils.name = ?
+        ORDER BY pupils.id
+    """, (name,))
+    return [Pupil._make(row) for row in rows]
+
+
+def fetch_custom_scores(conn, student_ids):
+    """一次性查询多名学生的自定义学科成绩，在内存中按学生分组，返回 {学生id: {学科: 成绩}}"""
+    scores_by_student = {}
+    if student_ids:
+        placeholders = ', '.join('?' * len(student_ids))
+        rows = conn.execute(f"""
+            SELECT student_fields.student_id, subjects.subject_name, student_fields.field_value
+            FROM student_fields
+            JOIN subjects ON subjects.id = student_fields.subject_id
+            WHERE student_fields.student_id IN ({placeholders})
+        """, list(student_ids))
+        for student_id, field_name, field_value in rows:
+            scores_by_student.setdefault(student_id, {})[field_name] = field_value
+    return scores_by_student
+
+
+def _subject_label_sql(subject_id):
+    """把 subject_stats 的学科 id 转换为显示名称（固定学科的中文名称或自定义学科名称）的表达式
+
+    自定义学科与固定学科的中文名称相同时追加“（自定义）”，图表和统计文字中不会混淆。
+    """
+    fixed = " ".join(f"WHEN {FIXED_SUBJECT_IDS[column]} THEN '{label}'" for column, label in SUBJECT_LABELS.items())
+    labels = ", ".join(f"'{label}'" for label in SUBJECT_LABELS.values())
+    return f"""CASE {subject_id} {fixed} ELSE (
+                   SELECT subject_name || CASE WHEN subject_name IN ({labels}) THEN '（自定义）' ELSE '' END
+                   FROM subjects WHERE id = {subject_id}) END"""
+
+
+def fetch_subject_stats(conn, exam_name):
+    """从 subject_stats 读取考试各学科（固定学科在前，自定义学科按创建顺序在后）的汇总统计，只读取 O(学科数) 行
+
+    缺考成绩不计入。返回 [(学科 id, 显示名称, {'count', 'mean', 'min', 'max', 'std'}), ...]，标准差为总体标准差；
+    学科 id 见 subject_stats，自定义学科可能与固定学科同名，合并其他结果时应按学科 id 对应。
+    删除过最低/最高分的学科先重新计算准确的最值。
+    """
+    exam_id = fetch_exam_id(conn, exam_name)
+    fixed_columns = {subject_id: column for column, subject_id in FIXED_SUBJECT_IDS.items()}
+    stale = [row[0] for row in conn.execute(
+        "SELECT subject_id FROM subject_stats WHERE exam_id = ? AND extremes_stale", (exam_id,))]
+    if stale:
+        with transaction(conn):
+            for subject_id in stale:
+                if subject_id in fixed_columns:
+                    column = fixed_columns[subject_id]
+                    extremes = conn.execute(f"""
+                        SELECT MIN({column}), MAX({column}) FROM students WHERE exam_id = ?
+                    """, (exam_id,)).fetchone()
+                else:
+                    extremes = conn.execute(f"""
+                        SELECT MIN(score), MAX(score) FROM (
+                            SELECT {_custom_score_sql('student_fields.field_value')} AS score
+                            FROM student_fields
+                            JOIN students ON student_fields.student_id = students.id
+                            WHERE students.exam_id = ? AND student_fields.subject_id = ?)
+                    """, (exam_id, subject_id)).fetchone()
+                conn.execute("""
+                    UPDATE subject_stats SET min_score = ?, max_score = ?, extremes_stale = 0
+                    WHERE exam_id = ? AND subject_id = ?
+                """, (*extremes, exam_id, subject_id))
+
+    # 固定学科按 FIXED_SUBJECT_IDS 的顺序在前，自定义学科按创建顺序，与 fetch_exam_custom_fields 一致
+    rows = conn.execute(f"""
+        SELECT subject_id, {_subject_label_sql('subject_id')}, cnt, total, total_sq, min_score, max_score
+        FROM subject_stats
+        WHERE exam_id = ?
+        ORDER BY subject_id > 0, ABS(subject_id)
+    """, (exam_id,))
+    statistics = []
+    for subject_id, label, count, total, total_sq, min_score, max_score in rows:
+        mean = total / count
+        statistics.append((subject_id, label, {
+            'count': count,
+            'mean': mean,
+            'min': min_score,
+            'max': max_score,
+            'std': max(total_sq / count - mean * mean, 0) ** 0.5,
+        }))
+    return statistics
+
+
+def _interpolated_percentiles(scores):
+    """已升序排列的成绩的百分位数（线性插值，与 numpy.percentile 的默认方法相同），返回 {'p25': ..., ...}"""
+    last = len(scores) - 1
+    percentiles = {}
+    for p in STAT_PERCENTILES:
+        position = last * (p / 100)
+        index = int(position)
+        upper = scores[min(index + 1, last)]
+        percentiles[f'p{p}'] = scores[index] + (position - index) * (upper - scores[index])
+    return percentiles
+
+
+def compute_exam_percentiles(conn, exam_name):
+    """计算考试各学科成绩的百分位数（线性插值），返回 {学科 id: {'p25': ..., ...}}，学科 id 同 fetch_subject_stats
+
+    百分位数需要排序全部成绩，无法从 subject_stats 得出。固定学科和自定义学科各只扫描一次考试的成绩，
+    排序和插值在 Python 中完成，比在 SQLite 中按学科做窗口函数快得多。
+    """
+    exam_id = fetch_exam_id(conn, exam_name)
+    rows = conn.execute(f"SELECT {', '.join(FIXED_SUBJECT_IDS)} FROM students WHERE exam_id = ?",
+                        (exam_id,)).fetchall()
+    scores_by_subject = {subject_id: [score for score in scores if score is not None]
+                         for subject_id, scores in zip(FIXED_SUBJECT_IDS.values(), zip(*rows))}
+
+    # 自定义学科的 id 为正数，不会与固定学科的保留 id 冲突
+    rows = conn.execute(f"""
+        SELECT student_fields.subject_id, {_custom_score_sql('student_fields.field_value')}
+        FROM student_fields
+        JOIN students ON student_fields.student_id = students.id
+        WHERE students.exam_id = ?
+    """, (exam_id,))
+    for subject_id, score in rows:
+        if score is not None:
+            scores_by_subject.setdefault(subject_id, []).append(score)
+
+    percentiles = {}
+    for subject_id, scores in scores_by_subject.items():
+        if scores:
+            scores.sort()
+            percentiles[subject_id] = _interpolated_percentiles(scores)
+    return percentiles
+
+
+def compute_exam_statistics(conn, exam_name):
+    """考试各学科（固定学科在前，自定义学科在后）的完整统计量：汇总统计加百分位数
+
+    返回 [(学科 id, 显示名称, {'count', 'mean', 'min', 'max', 'std', 'p25', ...}), ...]，缺考成绩不参与统计。
+    """
+    percentiles = compute_exam_percentiles(conn, exam_name)
+    return [(subject_id, label, {**stats, **percentiles.get(subject_id, {})})
+            for subject_id, label, stats in fetch_subject_stats(conn, exam_name)]
+
+
+def compute_student_trend(conn, pupil_id, column='total_score'):
+    """一次查询一个学生身份在各次考试中的成绩走势及对应考试的平均分，考试按创建顺序排列
+
+    返回 [TrendPoint(考试名称, 学生成绩, 考试平均分, 记录数), ...]，缺考成绩为 None。
+    同一场考试中有多条记录关联到该身份时（如尚未区分的同名学生），不取平均，成绩为 None，
+    由记录数大于 1 标出，调用方应提示用户在修改学生时指定身份。
+    """
+    if column not in SCORE_COLUMNS:
+        raise ValueError(f"不支持查看 {column} 的趋势")
+    rows = conn.execute(f"""
+        SELECT exams.exam_name, CASE WHEN COUNT(*) = 1 THEN MAX(students.{column}) END,
+               (SELECT AVG(others.{column}) FROM students AS others WHERE others.exam_id = exams.id),
+               COUNT(*)
+        FROM students
+        JOIN exams ON exams.id = students.exam_id
+        WHERE students.pupil_id = ?
+        GROUP BY students.exam_id
+        ORDER BY students.exam_id
+    """, (pupil_id,))
+    return [TrendPoint._make(row) for row in rows]
+
+
+def export_students(conn, file_path, progress=None):
+    """以 openpyxl 只写模式流式导出全部学生到 Excel，内存占用与学生数量无关
+
+    progress(已导出人数, 总人数) 每导出 EXPORT_PROGRESS_INTERVAL 名学生及结束时调用一次。
+    返回导出的学生人数。
+    """
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("学生信息")
+
+    # 写入表头
+    custom_fields = [row[0] for row in conn.execute("""
+        SELECT subject_name FROM subjects
+        WHERE id IN (SELECT subject_id FROM student_fields)
+        ORDER BY id
+    """)]
+    ws.append(['姓名', '语文', '数学', '英语'] + custom_fields)
+
+    total = conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    # 单个游标按学生顺序读取学生及其自定义学科，逐个学生写入
+    rows = conn.execute("""
+        SELECT students.id, students.name, students.chinese, students.math, students.english,
+               subjects.subject_name, student_fields.field_value
+        FROM students
+        LEFT JOIN student_fields ON student_fields.student_id = students.id
+        LEFT JOIN subjects ON subjects.id = student_fields.subject_id
+        ORDER BY students.id
+    """)
+    exported = 0
+    if progress:
+        progress(exported, total)
+    for _, student_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        first = next(student_rows)
+        _, name, chinese, math, english, field_name, field_value = first
+        custom_data = {field_name: field_value} if field_name is not None else {}
+        for row in student_rows:
+            custom_data[row[5]] = row[6]
+
+        row = [name, format_score(chinese), format_score(math), format_score(english)]
+        for field in custom_fields:
+            row.append(custom_data.get(field, MISSING_SCORE))
+        ws.append(row)
+
+        exported += 1
+        if progress and exported % EXPORT_PROGRESS_INTERVAL == 0:
+            progress(exported, total)
+
+    wb.save(file_path)
+    if progress:
+        progress(exported, total)
+    return exported
+
+
+def _read_import_rows(file_path):
+    """逐行读取 .xlsx（只读模式）或 .csv 文件，第一行为表头"""
+    if file_path.lower().endswith('.csv'):
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+    else:
+        import openpyxl
+
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+
+def import_students(conn, file_path, exam_name, progress=None):
+    """从 Excel/CSV 批量导入学生到指定考试（不存在时自动创建），全部数据在一个事务中写入
+
+    表头中的“姓名/语文/数学/英语”对应固定列，其余非空表头作为自定义学科。
+    progress(已导入人数) 每导入一批调用一次。任一行数据无效时整体回滚并抛出 ValueError。
+    返回导入的学生人数。
+    """
+    rows = _read_import_rows(file_path)
+    header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+    if '姓名' not in header:
+        raise ValueError("表头中缺少“姓名”列")
+    duplicates = [col for col, count in Counter(col for col in header if col).items() if count > 1]
+    if duplicates:
+        raise ValueError(f"表头中有重复的列: {'、'.join(duplicates)}")
+    fixed_index = {IMPORT_COLUMNS[col]: i for i, col in enumerate(header) if col in IMPORT_COLUMNS}
+    custom_index = [(col, i) for i, col in enumerate(header) if col and col not in IMPORT_COLUMNS]
+
+    def cell(row, i):
+        value = row[i] if i is not None and i < len(row) else None
+        return '' if value is None else str(value).strip()
+
+    with transaction(conn, 'IMMEDIATE'):
+        exam_id = ensure_exam(conn, exam_name)
+        subject_ids = ensure_subjects(conn, [col for col, _ in custom_index])
+        # 在写事务中预先分配学生 id，自定义学科无需逐行回查 lastrowid
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM students").fetchone()[0]
+
+        imported = 0
+        student_batch = []
+        field_batch = []
+
+        def flush():
+            conn.executemany("""INSERT INTO students (id, name, chinese, math, english, exam_id)
+                                VALUES (?, ?, ?, ?, ?, ?)""", student_batch)
+            conn.executemany("INSERT INTO student_fields (student_id, subject_id, field_value) VALUES (?, ?, ?)",
+                             field_batch)
+            student_batch.clear()
+            field_batch.clear()
+            if progress:
+                progress(imported)
+
+        for row_no, row in enumerate(rows, start=2):
+            if not any(cell(row, i) for i in range(len(row))):
+                continue
+            name = cell(row, fixed_index['name'])
+            if not name:
+                raise ValueError(f"第 {row_no} 行姓名为空")
+            try:
+                scores = [parse_score(cell(row, fixed_index.get(col))) for col in ('chinese', 'math', 'english')]
+                custom_scores = [(col, cell(row, i)) for col, i in custom_index]
+                for _, value in custom_scores:
+                    parse_score(value)
+            except ValueError:
+                raise ValueError(f"第 {row_no} 行成绩必须为数字")
+
+            student_batch.append((next_id, name, *scores, exam_id))
+            field_batch.extend((next_id, subject_ids[col], value) for col, value in custom_scores
+                               if value and value != MISSING_SCORE)
+            next_id += 1
+            imported += 1
+            if len(student_batch) >= IMPORT_BATCH_SIZE:
+                flush()
+
+        flush()
+    return imported
+
+
+def write_operations(conn, events):
+    """在一个事务中批量写入操作日志，events 为 [(用户名, 操作, 时间), ...]
+
+    操作日志不影响排名，写入前有效的排名快照（见 _ensure_exam_ranks）写入后仍然有效。
+    """
+    changes = conn.total_changes
+    conn.executemany("INSERT INTO operations (username, operation_type, operation_time) VALUES (?, ?, ?)",
+                     events)
+    conn.commit()
+    snapshot = getattr(conn, 'rank_snapshot', None)
+    if snapshot is not None and snapshot[2] == changes:
+        conn.rank_snapshot = snapshot[:2] + (conn.total_changes,)
+
+
+def parse_audit_time(text, end=False):
+    """解析操作日志的筛选时间，支持 YYYY-MM-DD、YYYY-MM-DD HH:MM 和 YYYY-MM-DD HH:MM:SS
+
+    空白返回 None，格式错误抛出 ValueError。end 为真时返回所给时间段之后的第一秒，
+    作为不含的上界，因此结束日期当天的操作也会被查出；时间段一直到 datetime 能表示的最后时刻
+    （如 9999-12-31）时没有上界，返回 None。
+    """
+    text = text.strip()
+    if not text:
+        return None
+    for fmt, step in (('%Y-%m-%d %H:%M:%S', timedelta(seconds=1)), ('%Y-%m-%d %H:%M', timedelta(minutes=1)),
+                      ('%Y-%m-%d', timedelta(days=1))):
+        try:
+            moment = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if end:
+            try:
+                moment += step
+            except OverflowError:
+                return None
+        return moment.strftime(AUDIT_TIME_FORMAT)
+    raise ValueError(f"无法识别的时间: {text}")
+
+
+def fetch_operations(conn, start=None, end=None, limit=AUDIT_PAGE_SIZE):
+    """按时间范围 [start, end) 查询操作日志（走 operation_time 索引），最新的在前
+
+    返回 [Operation(时间, 用户名, 操作), ...]，start/end 为 None 表示不限。
+    """
+    rows = conn.execute("""
+        SELECT operation_time, username, operation_type
+        FROM operations
+        WHERE operation_time >= ? AND operation_time < ?
+        ORDER BY operation_time DESC
+        LIMIT ?
+    """, (start or '0000-01-01 00:00:00', end or '9999-12-31 23:59:59', limit))
+    return [Operation._make(row) for row in rows]
+
+
+def fetch_users(conn):
+    """返回所有账号（User），按创建顺序排列"""
+    return [User._make(row) for row in conn.execute("SELECT id, username FROM users ORDER BY id")]
+
+
+def fetch_username(conn, user_id):
+    """查询账号的用户名，账号不存在时返回 None"""
+    row = conn.execute("SELECT username FROM users WHERE id=?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def authenticate(conn, username, password):
+    """用户名和密码是否匹配"""
+    return conn.execute("SELECT 1 FROM users WHERE username=? AND password=?",
+                        (username, password)).fetchone() is not None
+
+
+def check_password(conn, user_id, password):
+    """账号的密码是否为 password"""
+    return conn.execute("SELECT 1 FROM users WHERE id=? AND password=?", (user_id, password)).fetchone() is not None
+
+
+def create_user(conn, username, password):
+    """创建账号并返回 id，用户名已存在时抛出 sqlite3.IntegrityError"""
+    with transaction(conn):
+        return conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password)).lastrowid
+
+
+def update_user(conn, user_id, username, password=None):
+    """修改账号的用户名，password 不为空时同时修改密码；用户名已存在时抛出 sqlite3.IntegrityError"""
+    with transaction(conn):
+        if password:
+            conn.execute("UPDATE users SET username=?, password=? WHERE id=?", (username, password, user_id))
+        else:
+            conn.execute("UPDATE users SET username=? WHERE id=?", (username, user_id))
+
+
+def delete_user(conn, user_id):
+    """删除账号"""
+    with transaction(conn):
+        conn.execute("DELETE FROM users WHERE id=?", (user_id,))
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import student_db  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """按当前结构新建的临时数据库"""
+    conn = student_db.connect_db(str(tmp_path / "students.db"))
+    student_db.init_schema(conn)
+    yield conn
+    conn.close()
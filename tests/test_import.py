@@ -0,0 +1,20 @@
+import pytest
+
+from student_db import count_exam_students, fetch_exam_names, import_students
+
+
+def test_duplicate_header_is_rejected(conn, tmp_path):
+    path = tmp_path / "students.csv"
+    path.write_text("姓名,语文,数学,英语,物理,物理\n甲,90,80,70,60,50\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="物理"):
+        import_students(conn, str(path), '期中')
+    assert '期中' not in fetch_exam_names(conn)
+
+
+def test_import_csv(conn, tmp_path):
+    path = tmp_path / "students.csv"
+    path.write_text("姓名,语文,数学,英语,物理\n甲,90,80,70,60\n乙,无,85,75,\n", encoding="utf-8")
+
+    assert import_students(conn, str(path), '期中') == 2
+    assert count_exam_students(conn, '期中') == 2
@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+import student_db
+from student_db import (
+    NEW_PUPIL, SCHEMA_VERSION, StudentInfo, add_student, delete_exam, delete_student, fetch_exam_names,
+    fetch_pupils, fetch_subject_stats, rebuild_subject_stats, update_student,
+)
+
+
+def _create_baseline(path):
+    """按最初版本的表结构建库：成绩为 TEXT、缺考记为“无”，学生按考试名称和自定义学科名称存储"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT);
+        CREATE TABLE students (
+            id INTEGER PRIMARY KEY, name TEXT, chinese TEXT, math TEXT, english TEXT, exam_name TEXT);
+        CREATE TABLE student_fields (
+            id INTEGER PRIMARY KEY, student_id INTEGER, field_name TEXT, field_value TEXT,
+            FOREIGN KEY (student_id) REFERENCES students(id));
+        CREATE TABLE operations (
+            id INTEGER PRIMARY KEY, username TEXT, operation_type TEXT, operation_time DATETIME);
+        CREATE TABLE exams (id INTEGER PRIMARY KEY, exam_name TEXT UNIQUE);
+    ''')
+    conn.execute("INSERT INTO exams (exam_name) VALUES ('期中')")
+    conn.executemany("INSERT INTO students (id, name, chinese, math, english, exam_name) VALUES (?, ?, ?, ?, ?, ?)", [
+        (1, '张三', '90', '无', '80', '期中'),
+        (2, '李四', '85', '70', '', '期中'),
+        # 考试从未登记到 exams 中
+        (3, '张三', '88', '92', '76', '月考'),
+        # 没有考试名称，无法迁移
+        (4, '王五', '60', '60', '60', None),
+    ])
+    conn.executemany("INSERT INTO student_fields (student_id, field_name, field_value) VALUES (?, ?, ?)", [
+        (1, '物理', '70'),
+        # 重复的自定义学科成绩，迁移时只保留最后一条
+        (1, '物理', '75'),
+        (2, '物理', '无'),
+        (2, 'math', '99'),
+        (3, '物理', '81'),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def _stats(conn):
+    """subject_stats 的全部汇总行，先读取各考试的统计以重新计算标记为过期的最低/最高分"""
+    for exam_name in fetch_exam_names(conn):
+        fetch_subject_stats(conn, exam_name)
+    return conn.execute("""
+        SELECT exam_id, subject_id, cnt, total, total_sq, min_score, max_score
+        FROM subject_stats ORDER BY exam_id, subject_id
+    """).fetchall()
+
+
+def _assert_stats_consistent(conn):
+    """触发器增量维护的汇总与从成绩重新计算的结果一致（浮点累加误差除外）"""
+    incremental = _stats(conn)
+    rebuild_subject_stats(conn)
+    rebuilt = _stats(conn)
+    assert [row[:3] for row in incremental] == [row[:3] for row in rebuilt]
+    assert [row[3:] for row in incremental] == [pytest.approx(row[3:]) for row in rebuilt]
+
+
+@pytest.fixture
+def migrated(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    _create_baseline(path)
+    conn = student_db.connect_db(path)
+    notices = student_db.init_schema(conn)
+    yield conn, notices
+    conn.close()
+
+
+def test_migrate_baseline(migrated):
+    conn, notices = migrated
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert notices == ["删除了 1 名未填写考试名称的学生"]
+    assert fetch_exam_names(conn) == ['期中', '月考']
+
+    rows = conn.execute("SELECT id, chinese, math, english, total_score FROM students ORDER BY id").fetchall()
+    assert rows == [(1, 90.0, None, 80.0, 170.0), (2, 85.0, 70.0, None, 155.0), (3, 88.0, 92.0, 76.0, 256.0)]
+    assert conn.execute("""
+        SELECT field_value FROM student_fields JOIN subjects ON subjects.id = student_fields.subject_id
+        WHERE student_id = 1 AND subject_name = '物理'
+    """).fetchall() == [('75',)]
+
+    # 跨考试同名的学生关联到同一个身份
+    pupils = list(fetch_pupils(conn, '张三'))
+    assert [pupil.exam_names for pupil in pupils] == ['期中、月考']
+    assert conn.execute("SELECT COUNT(*) FROM students WHERE pupil_id IS NULL").fetchone()[0] == 0
+    _assert_stats_consistent(conn)
+
+
+def test_stats_follow_writes(migrated):
+    conn, _ = migrated
+    new_id = add_student(conn, '赵六', 100, 50, None, '期中', {'物理': '90', 'math': '10'})
+    _assert_stats_consistent(conn)
+
+    # 修改固定学科和自定义学科成绩，删除一门自定义学科，删除当前的最高分
+    update_student(conn, 1, StudentInfo('张三', 95, 60, 80, '期中'), removed_fields=['物理'],
+                   changed_scores={'化学': '66'})
+    update_student(conn, new_id, StudentInfo('赵六', 40, 50, None, '期中'), changed_scores={'物理': '无'})
+    _assert_stats_consistent(conn)
+
+    # 转到另一场考试时连同自定义学科成绩一起移动
+    update_student(conn, 2, StudentInfo('李四', 85, 70, None, '月考'))
+    _assert_stats_consistent(conn)
+
+    delete_student(conn, 3)
+    _assert_stats_consistent(conn)
+
+    delete_exam(conn, '期中')
+    _assert_stats_consistent(conn)
+    assert conn.execute("SELECT exam_id FROM subject_stats").fetchall() == [(2,)] * 3
+
+
+def test_namesake_identity(migrated):
+    conn, _ = migrated
+    other = add_student(conn, '张三', 50, 50, 50, '月考', {})
+    update_student(conn, other, pupil=NEW_PUPIL)
+    assert len(list(fetch_pupils(conn, '张三'))) == 2
+
+    delete_student(conn, other)
+    assert len(list(fetch_pupils(conn, '张三'))) == 1
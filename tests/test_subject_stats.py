@@ -0,0 +1,24 @@
+from student_db import FIXED_SUBJECT_IDS, add_student, compute_exam_statistics, fetch_subject_stats
+
+
+def test_custom_subject_named_like_fixed_column(conn):
+    add_student(conn, '甲', 70, 80, 90, '期中', {'chinese': '99', '语文': '60'})
+    add_student(conn, '乙', 88, 80, 90, '期中', {'chinese': '99', '语文': '62'})
+
+    statistics = {subject_id: (label, stats) for subject_id, label, stats in compute_exam_statistics(conn, '期中')}
+    label, stats = statistics.pop(FIXED_SUBJECT_IDS['chinese'])
+    assert label == '语文'
+    assert (stats['count'], stats['mean'], stats['min'], stats['max']) == (2, 79, 70, 88)
+    assert stats['p25'] == 74.5
+
+    custom = {label: stats for label, stats in statistics.values()}
+    assert custom['chinese']['mean'] == custom['chinese']['p25'] == 99
+    assert custom['语文（自定义）']['mean'] == 61
+    assert len({label for _, label, _ in fetch_subject_stats(conn, '期中')}) == 5
+
+
+def test_custom_subjects_in_creation_order(conn):
+    add_student(conn, '甲', 70, 80, 90, '期中', {'物理': '60', '化学': '70'})
+
+    labels = [label for _, label, _ in fetch_subject_stats(conn, '期中')]
+    assert labels == ['语文', '数学', '英语', '物理', '化学']